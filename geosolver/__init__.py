@@ -1,5 +1,6 @@
 
 __all__ = [
+    "budget",
     "clsolver2D",
     "clsolver3D",
     "clsolver",
@@ -10,14 +11,18 @@ __all__ = [
     "geometric",
     "gmatch",
     "graph",
+    "imatch",
     "intersections",
     "map",
     "matfunc",
     "method",
     "multimethod",
     "notify",
+    "prange",
     "randomproblem",
+    "rigid",
     "selconstr",
+    "solutionspace",
     "tolerance",
     "vector"
 ]
@@ -29,3 +34,5 @@ from geometric import ParametricConstraint
 from geometric import DistanceConstraint
 from geometric import AngleConstraint
 from geometric import FixConstraint
+from prange import sample_prange
+from budget import CancelToken
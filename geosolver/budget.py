@@ -0,0 +1,64 @@
+"""Limits on the time spent solving.
+
+A Budget combines a wall-clock deadline and a CancelToken. The ClusterSolver
+checks its budget before each search step, and the MethodGraph before each
+method execution. When the budget is exhausted, solving stops and the remaining
+work is left pending, so the results are partial. Pending work is resumed when
+the solver gets a new budget (see ClusterSolver.set_budget).
+"""
+
+import time
+
+class CancelToken:
+    """A flag for cooperative cancellation, e.g. set by another thread"""
+
+    def __init__(self):
+        self._cancelled = False
+
+    def cancel(self):
+        """request cancellation"""
+        self._cancelled = True
+
+    def reset(self):
+        """withdraw the cancellation request"""
+        self._cancelled = False
+
+    def cancelled(self):
+        """True iff cancellation was requested"""
+        return self._cancelled
+
+class Budget:
+    """A wall-clock deadline and/or a CancelToken.
+
+       instance attributes:
+        deadline    - the time (see time.time) after which solving stops, or None
+        token       - a CancelToken, or None
+    """
+
+    DEADLINE = "deadline"
+    CANCELLED = "cancelled"
+
+    def __init__(self, deadline=None, token=None):
+        self.deadline = deadline
+        self.token = token
+
+    def exhausted(self):
+        """Returns the reason to stop solving (DEADLINE or CANCELLED), or None"""
+        if self.token != None and self.token.cancelled():
+            return Budget.CANCELLED
+        if self.deadline != None and time.time() > self.deadline:
+            return Budget.DEADLINE
+        return None
+
+    def __str__(self):
+        return "Budget(deadline="+str(self.deadline)+", token="+str(self.token)+")"
+
+def test():
+    token = CancelToken()
+    budget = Budget(time.time() + 60.0, token)
+    print budget.exhausted()
+    token.cancel()
+    print budget.exhausted()
+    print Budget(time.time() - 1.0).exhausted()
+
+if __name__ == "__main__": test()
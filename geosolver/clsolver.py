@@ -9,14 +9,15 @@ is a directed acyclic graph of Clusters and Methods. Particilar problems
 and solutions are represented by a Configuration for each cluster.
 """
 
-from graph import Graph
+from graph import Graph, RelationGraph
 from method import Method, MethodGraph
 from diagnostic import diag_print
 from notify import Notifier
 from sets import Set, ImmutableSet
 from multimethod import MultiVariable, MultiMethod
 from cluster import *
-from configuration import Configuration
+from configuration import Configuration, SolutionSet
+from solutionspace import SolutionSpace
 
 # Basic methods 
 
@@ -32,6 +33,14 @@ class ClusterMethod(MultiMethod):
     def prototype_constraints(self):
         return []
 
+    def collect(self, values):
+        if isinstance(values, SolutionSet):
+            return values
+        return SolutionSet(values)
+
+    def unchanged(self, old, new):
+        return old.identical(new)
+
     def status_str(self):
         s = ""
         if self.consistent == True:
@@ -56,23 +65,41 @@ class PrototypeMethod(MultiMethod):
         self._constraints = constraints
         MultiMethod.__init__(self)
 
+    def collect(self, values):
+        return SolutionSet(values)
+
+    def unchanged(self, old, new):
+        return old.identical(new)
+
     def multi_execute(self, inmap):
         diag_print("PrototypeMethod.multi_execute called","clmethods")
         incluster = self._inputs[0] 
-        selclusters = []
-        for i in range(1,len(self._inputs)):
-            selclusters.append(self._inputs[i])
+        selclusters = self.selection_clusters()
         diag_print("input clusters"+str(incluster), "PrototypeMethod.multi_execute")
         diag_print("selection clusters"+str(selclusters), "PrototypeMethod.multi_execute")
         # get confs
         inconf = inmap[incluster]
+        selconf = self.selection_configuration(map(lambda c: inmap[c], selclusters))
+        if self.select(inconf, selconf):
+            return [inconf]
+        else:
+            return []
+
+    def selection_clusters(self):
+        """the prototype clusters (single point Rigids) used for selection"""
+        return self._inputs[1:]
+
+    def selection_configuration(self, confs):
+        """combine the configurations of the selection clusters"""
         selmap = {}
-        for cluster in selclusters:
-            conf = inmap[cluster]
+        for conf in confs:
             assert len(conf.vars()) == 1
             var = conf.vars()[0]
             selmap[var] = conf.map[var]
-        selconf = Configuration(selmap)
+        return Configuration(selmap)
+
+    def select(self, inconf, selconf):
+        """True iff the input configuration is selected by the prototype"""
         sat = True
         diag_print("input configuration = "+str(inconf), "PrototypeMethod.multi_execute")
         diag_print("selection configuration = "+str(selconf), "PrototypeMethod.multi_execute")
@@ -82,10 +109,110 @@ class PrototypeMethod(MultiMethod):
             diag_print("constraint satisfied? "+str(satcon), "PrototypeMethod.multi_execute")
             sat = sat and satcon
         diag_print("prototype satisfied? "+str(sat), "PrototypeMethod.multi_execute")
-        if sat:
-            return [inconf]
-        else:
-            return []
+        return sat
+
+
+class PrototypeFilter:
+    """Filters the output of a merge method, rejecting solutions that would be
+       rejected by the PrototypeMethod that selects from the merge output.
+       Rejected solutions are then never stored or passed on.
+       The prototype configurations are read from the method graph, so
+       the merge must be re-executed when a prototype changes.
+    """
+
+    def __init__(self, selector, methodgraph):
+        self.selector = selector
+        self._mg = methodgraph
+
+    def __call__(self, conf):
+        confsets = []
+        for cluster in self.selector.selection_clusters():
+            confs = self._mg.get(cluster)
+            if confs == None:
+                # cannot select yet
+                return True
+            confsets.append(confs)
+        for confs in _product(confsets):
+            selconf = self.selector.selection_configuration(confs)
+            if self.selector.select(conf, selconf):
+                return True
+        return False
+
+class PrototypeScore:
+    """Scores configurations by their difference with the prototype, i.e. the 
+       configurations of the single point Rigids of the variables 
+       (see Configuration.difference). Lower is better.
+    """
+
+    def __init__(self, solver):
+        self._solver = solver
+        self._prototypes = {}
+        """map from variables to prototype clusters"""
+
+    def __call__(self, conf):
+        protomap = {}
+        for var in conf.vars():
+            cluster = self._prototype(var)
+            if cluster == None:
+                continue
+            confs = self._solver.get(cluster)
+            if confs == None or len(confs) == 0:
+                continue
+            protomap[var] = confs[0].get(var)
+        if len(protomap) == 0:
+            return (0, 0.0)
+        return conf.difference(Configuration(protomap))
+
+    def _prototype(self, var):
+        cluster = self._prototypes.get(var)
+        if cluster == None or not self._solver.contains(cluster):
+            cluster = None
+            if self._solver.contains(var):
+                for c in self._solver.find_dependend(var):
+                    if isinstance(c, Rigid) and len(c.vars) == 1:
+                        cluster = c
+                        break
+            self._prototypes[var] = cluster
+        return cluster
+
+class TrackingScore:
+    """Scores configurations by their difference with tracked configurations, 
+       e.g. the previously chosen solutions (see Configuration.difference). 
+       Each configuration is compared with the tracked configuration that shares 
+       the most variables. Lower is better.
+    """
+
+    def __init__(self, configurations=[]):
+        self.track(configurations)
+
+    def track(self, configurations):
+        """Set the tracked configurations"""
+        self._tracked = map(lambda c: (c, Set(c.vars())), configurations)
+
+    def tracked(self):
+        """Returns the list of tracked configurations"""
+        return map(lambda (c, vars): c, self._tracked)
+
+    def __call__(self, conf):
+        best = None
+        shared = 0
+        for (tracked, vars) in self._tracked:
+            n = len(vars.intersection(conf.vars()))
+            if n > shared:
+                best = tracked
+                shared = n
+        if best == None:
+            return (0, 0.0)
+        return conf.difference(best)
+
+def _product(lists):
+    """generate all combinations of elements of the given lists"""
+    if len(lists) == 0:
+        yield []
+    else:
+        for x in lists[0]:
+            for rest in _product(lists[1:]):
+                yield [x]+rest
             
 def is_information_increasing(method):
         infinc = True
@@ -110,55 +237,70 @@ class ClusterSolver(Notifier):
         """Create a new empty solver"""
         Notifier.__init__(self)
         self.dimension = dimension
-        self._graph = Graph()
-        self._graph.add_vertex("_root")
-        self._graph.add_vertex("_toplevel")
-        self._graph.add_vertex("_variables")
-        self._graph.add_vertex("_distances")
-        self._graph.add_vertex("_angles")
-        self._graph.add_vertex("_rigids")
-        self._graph.add_vertex("_hedgehogs")
-        self._graph.add_vertex("_balloons")
-        self._graph.add_vertex("_methods")
-        # queue of new objects to process
+        # decomposition: relations between objects and groups of objects 
+        self._graph = RelationGraph(
+            ["dependency", "needed_by"],
+            ["_root", "_toplevel", "_variables", "_distances", "_angles", 
+             "_rigids", "_hedgehogs", "_balloons", "_methods"])
+        # stack of new objects to process
         self._new = []
+        # clusters added in a batch, to be added in the same order at the end
+        self._queued = []
+        # map from variables to the set of top-level clusters containing it
+        self._toplevel_vars = {}
+        # nesting depth of batches (searching is deferred while in a batch)
+        self._batch = 0
+        # beam width and score function (see set_beam)
+        self._beam = (None, None)
+        # maximum number of configurations per merge (see set_max_solutions)
+        self._max_solutions = None
+        # budget checked while searching, and the reason searching was stopped
+        self._budget = None
+        self._interrupted = None
         # methodgraph 
         self._mg = MethodGraph()
          
     def variables(self):
         """get list of variables"""
-        return self._graph.outgoing_vertices("_variables")
+        return list(self._graph.group("_variables"))
 
     def distances(self):
         """get list of distances"""
-        return self._graph.outgoing_vertices("_distances")
+        return list(self._graph.group("_distances"))
 
     def angles(self):
         """get list of angles"""
-        return self._graph.outgoing_vertices("_angles")
+        return list(self._graph.group("_angles"))
 
     def rigids(self):
         """get list of rigids"""
-        return self._graph.outgoing_vertices("_rigids")
+        return list(self._graph.group("_rigids"))
 
     def hedgehogs(self):
         """get list of hedgehogs"""
-        return self._graph.outgoing_vertices("_hedgehogs")
+        return list(self._graph.group("_hedgehogs"))
 
     def balloons(self):
         """get list of balloons"""
-        return self._graph.outgoing_vertices("_balloons")
+        return list(self._graph.group("_balloons"))
 
     def methods(self):
         """get list of methods"""
-        return self._graph.outgoing_vertices("_methods")
+        return list(self._graph.group("_methods"))
 
     def top_level(self):
         """get top-level objects"""
-        return self._graph.outgoing_vertices("_toplevel")
+        return list(self._graph.group("_toplevel"))
 
     def is_top_level(self, object):
-        return self._graph.has_edge("_toplevel",object)
+        return self._graph.in_group("_toplevel",object)
+
+    def find_top_level(self, var):
+        """Return a list of top-level clusters that contain given variable"""
+        if var in self._toplevel_vars:
+            return list(self._toplevel_vars[var])
+        else:
+            return []
 
     def add(self, cluster):
         """Add a cluster. 
@@ -167,23 +309,154 @@ class ClusterSolver(Notifier):
               cluster: A Rigid
            """
         diag_print("add_cluster "+str(cluster), "clsolver")
-        self._add_cluster(cluster)
-        self._process_new()
+        if self._batch > 0:
+            # configurations can be set before the cluster is actually added
+            self._mg.add_variable(cluster)
+            self._queued.append(cluster)
+        else:
+            self._add_cluster(cluster)
+            self._process_new()
 
     def remove(self, cluster):
         """Remove a cluster. 
            All dependend objects are also removed.
         """
+        if cluster in self._queued:
+            self._queued.remove(cluster)
+            self._mg.rem_variable(cluster)
+            return
         self._remove(cluster)
         self._process_new()
 
     def set(self, cluster, configurations):
-        """Associate a list of configurations with a cluster"""
-        self._mg.set(cluster, configurations)
+        """Associate a list of configurations with a cluster. 
+           The configurations are stored in a SolutionSet."""
+        # merges filtered by a prototype must be re-executed
+        for selector in self.find_dependend(cluster):
+            if isinstance(selector, PrototypeMethod) and cluster in selector.selection_clusters():
+                self._mg.schedule(selector.merge)
+        # and merges with a beam, if a prototype point changes
+        (width, score) = self._beam
+        if width != None and not isinstance(score, TrackingScore) and isinstance(cluster, Rigid) and len(cluster.vars) == 1:
+            var = iter(cluster.vars).next()
+            for method in self.methods():
+                if isinstance(method, ClusterMethod) and var in method.outputs()[0].vars:
+                    self._mg.schedule(method)
+        self._mg.set(cluster, SolutionSet(configurations))
         
     def get(self, cluster):
-        """Return a set of configurations associated with a cluster"""
+        """Return a SolutionSet with the configurations associated with a cluster.
+           In lazy mode, the configurations are computed now (see set_lazy). 
+           Note: within a batch, configurations are not up to date.
+        """
         return self._mg.get(cluster)
+
+    def set_beam(self, width, score=None):
+        """Keep at most width configurations for each cluster determined by a merge:
+           those with the lowest score. The default score prefers configurations that 
+           best match the prototype (see PrototypeScore). If width is None, all 
+           configurations are kept.
+        """
+        if width != None and score == None:
+            score = PrototypeScore(self)
+        self._beam = (width, score)
+        for method in self.methods():
+            if isinstance(method, ClusterMethod):
+                method.set_beam(width, score)
+                self._mg.schedule(method)
+        self._mg.propagate()
+
+    def get_beam(self):
+        """Returns the beam width and score function (see set_beam)"""
+        return self._beam
+
+    def set_lazy(self, lazy):
+        """If lazy is True, clusters and methods are still added, but configurations 
+           are not propagated: they are computed when requested (see get). This is 
+           useful if only the decomposition is needed. If lazy is False, all 
+           configurations are computed now.
+        """
+        self._mg.set_lazy(lazy)
+
+    def is_lazy(self):
+        """True iff configurations are computed on demand (see set_lazy)"""
+        return self._mg.is_lazy()
+
+    def set_max_solutions(self, limit):
+        """Keep at most the given number of configurations for each cluster determined 
+           by a merge: the first ones computed. If limit is None, all configurations 
+           are kept. See also limited."""
+        self._max_solutions = limit
+        for method in self.methods():
+            if isinstance(method, ClusterMethod):
+                method.set_limit(limit)
+                self._mg.schedule(method)
+        self._mg.propagate()
+
+    def limited(self, cluster):
+        """True iff configurations of the given cluster, or of a cluster it was
+           determined from, were dropped due to the maximum number of solutions"""
+        visited = Set()
+        todo = [cluster]
+        while len(todo) > 0:
+            obj = todo.pop()
+            if obj in visited:
+                continue
+            visited.add(obj)
+            method = self._mg.determining_method(obj)
+            if method == None:
+                continue
+            if isinstance(method, MultiMethod) and method.limited():
+                return True
+            todo.extend(method.inputs())
+        return False
+
+    def set_budget(self, budget):
+        """Set a Budget (see budget.py), checked before each search step and each 
+           method execution. When the budget is exhausted, solving stops and the 
+           results are partial (see interrupted). Setting a new budget resumes 
+           solving. If budget is None, there are no limits.
+        """
+        self._budget = budget
+        self._mg.set_budget(budget)
+        self._process_new()
+        self._mg.propagate()
+
+    def interrupted(self):
+        """Returns the reason solving was stopped (see Budget.exhausted), 
+           or None if the results are complete"""
+        if self._interrupted != None:
+            return self._interrupted
+        return self._mg.interrupted()
+
+    def solution_space(self, cluster):
+        """Return a SolutionSpace for a cluster, i.e. its configurations 
+           computed on demand from the configurations of the clusters it depends on."""
+        return SolutionSpace(self._mg, cluster)
+
+    def begin_batch(self):
+        """Start a batch of changes. Until the matching end_batch, clusters
+           that are added are not merged and configurations are not propagated.
+           Batches may be nested. The decomposition is the same as without a batch.
+        """
+        self._batch += 1
+        self._mg.begin_batch()
+
+    def in_batch(self):
+        """True iff changes are currently batched"""
+        return self._batch > 0
+
+    def end_batch(self):
+        """End a batch of changes. Adds the clusters in the order they were 
+           added in the batch, searching for merges after each, then propagates 
+           all configurations once.
+        """
+        if self._batch == 0:
+            raise StandardError, "end_batch without begin_batch"
+        self._batch -= 1
+        if self._batch == 0:
+            self._process_new()
+        self._mg.end_batch()
  
     def set_root(self, rigid):
         """Make given rigid cluster the root cluster
@@ -191,18 +464,16 @@ class ClusterSolver(Notifier):
            arguments:
               cluster: A Rigid
            """
-        self._graph.rem_vertex("_root")
-        self._graph.add_edge("_root", rigid)
+        self._graph.clear_group("_root")
+        self._graph.add_to_group("_root", rigid)
        
     def find_dependend(self, object):
         """Return a list of objects that depend on given object directly."""
-        l = self._graph.outgoing_vertices(object)
-        return filter(lambda x: self._graph.get(object,x) == "dependency", l)
+        return self._graph.outgoing_vertices("dependency", object)
         
     def find_depends(self, object):
         """Return a list of objects that the given object depends on directly"""
-        l = self._graph.ingoing_vertices(object)
-        return filter(lambda x: self._graph.get(x,object) == "dependency", l)
+        return self._graph.ingoing_vertices("dependency", object)
 
     def contains(self, obj):
         return self._graph.has_vertex(obj)
@@ -213,32 +484,39 @@ class ClusterSolver(Notifier):
 
     def _add_dependency(self, on, dependend):
         """Add a dependence for second object on first object"""
-        self._graph.add_edge(on, dependend, "dependency")
+        self._graph.add_edge("dependency", on, dependend)
 
     def _add_to_group(self, group, object):
         """Add object to group"""
-        self._graph.add_edge(group, object, "contains")
+        self._graph.add_to_group(group, object)
 
     def _add_needed_by(self, needed, by):
         """Add relation 'needed' object is needed 'by'"""
-        self._graph.add_edge(needed, by, "needed_by")
+        self._graph.add_edge("needed_by", needed, by)
 
     def _objects_that_need(self, needed):
         """Return objects needed by given object"""
-        l = self._graph.outgoing_vertices(needed)
-        return filter(lambda x: self._graph.get(needed,x) == "needed_by", l)
+        return self._graph.outgoing_vertices("needed_by", needed)
 
     def _objects_needed_by(self, needer):
         """Return objects needed by given object"""
-        l = self._graph.ingoing_vertices(needer)
-        return filter(lambda x: self._graph.get(x,needer) == "needed_by", l)
+        return self._graph.ingoing_vertices("needed_by", needer)
    
     def _add_top_level(self, object):
-        self._graph.add_edge("_toplevel",object)
+        self._graph.add_to_group("_toplevel",object)
+        for var in object.vars:
+            if var not in self._toplevel_vars:
+                self._toplevel_vars[var] = Set()
+            self._toplevel_vars[var].add(object)
         self._new.append(object)
 
     def _rem_top_level(self, object):
-        self._graph.rem_edge("_toplevel",object)
+        self._graph.rem_from_group("_toplevel",object)
+        for var in object.vars:
+            if var in self._toplevel_vars:
+                self._toplevel_vars[var].discard(object)
+                if len(self._toplevel_vars[var]) == 0:
+                    del self._toplevel_vars[var]
         if object in self._new:
             self._new.remove(object)
 
@@ -252,12 +530,18 @@ class ClusterSolver(Notifier):
             if hasattr(item, "restore_toplevel"):
                 for cluster in item.restore_toplevel:
                     torestore.add(cluster)
+            # remove from top level
+            if self.is_top_level(item):
+                self._rem_top_level(item)
             # delete it from graph
             diag_print("deleting "+str(item),"clsolver.remove")
             self._graph.rem_vertex(item)
             # remove from _new list
             if item in self._new:
                 self._new.remove(item)
+            # remove prototype filter from merge
+            if isinstance(item, PrototypeMethod):
+                self._rem_prototype_filter(item)
             # remove from methodgraph
             if isinstance(item, Method):
                 # note: method may have been removed because variable removed
@@ -328,8 +612,8 @@ class ClusterSolver(Notifier):
             self._add_variable(var)
             self._add_dependency(var, newcluster)
         # if there is no root cluster, this one will be it
-        if len(self._graph.outgoing_vertices("_root")) == 0:
-            self._graph.add_edge("_root", newcluster)
+        if len(self._graph.group("_root")) == 0:
+            self._graph.add_to_group("_root", newcluster)
         # add to top level
         self._add_top_level(newcluster)
         # add to methodgraph
@@ -399,15 +683,20 @@ class ClusterSolver(Notifier):
             overconstrained = overconstrained and cluster.overconstrained
         output.overconstrained = overconstrained
         # add to graph
-        self._add_cluster(output)
-        self._add_method(merge)
-        # remove inputs from toplevel
-        for cluster in merge.inputs():
-            self._rem_top_level(cluster)  
-        # add prototype selection method
-        self._add_prototype_selector(merge)
-        # add solution selection method
-        self._add_solution_selector(merge)
+        # (merge is executed after the selectors are added, see _add_prototype_selector)
+        self._mg.begin_batch()
+        try:
+            self._add_cluster(output)
+            self._add_method(merge)
+            # remove inputs from toplevel
+            for cluster in merge.inputs():
+                self._rem_top_level(cluster)  
+            # add prototype selection method
+            self._add_prototype_selector(merge)
+            # add solution selection method
+            self._add_solution_selector(merge)
+        finally:
+            self._mg.end_batch()
 
     def _add_prototype_selector(self, merge):
         incluster = merge.outputs()[0]
@@ -419,7 +708,7 @@ class ClusterSolver(Notifier):
             vars.union_update(con.variables())
         selclusters = []
         for var in vars:
-            clusters = self._graph.outgoing_vertices(var)
+            clusters = self.find_dependend(var)
             clusters = filter(lambda c: isinstance(c, Rigid), clusters)
             clusters = filter(lambda c: len(c.vars) == 1, clusters)
             if len(clusters) != 1:
@@ -432,8 +721,19 @@ class ClusterSolver(Notifier):
         self._add_cluster(outcluster)
         self._add_method(selector)
         self._rem_top_level(incluster)
+        # reject unselected solutions already in the merge
+        selector.merge = merge
+        selector.filter = PrototypeFilter(selector, self._mg)
+        merge.add_filter(selector.filter)
         return
 
+    def _rem_prototype_filter(self, selector):
+        merge = selector.merge
+        merge.rem_filter(selector.filter)
+        # previously rejected solutions are needed again
+        if merge in self._mg.methods():
+            self._mg.schedule(merge)
+
     def _add_solution_selector(self, merge):
         return
 
@@ -445,6 +745,11 @@ class ClusterSolver(Notifier):
         for obj in method.outputs():
             self._add_dependency(method, obj)
             self._add_dependency(obj, method)
+        (width, score) = self._beam
+        if width != None and isinstance(method, ClusterMethod):
+            method.set_beam(width, score)
+        if self._max_solutions != None and isinstance(method, ClusterMethod):
+            method.set_limit(self._max_solutions)
         self._mg.add_method(method)
         self.send_notify(("add", method))
  
@@ -454,7 +759,19 @@ class ClusterSolver(Notifier):
     # --------------
  
     def _process_new(self):
-        while len(self._new) > 0:
+        if self._batch > 0:
+            return
+        self._interrupted = None
+        while len(self._new) > 0 or len(self._queued) > 0:
+            if self._budget != None:
+                self._interrupted = self._budget.exhausted()
+                if self._interrupted != None:
+                    diag_print("search stopped: "+str(self._interrupted), "clsolver")
+                    return
+            if len(self._new) == 0:
+                # a cluster added in a batch
+                self._add_cluster(self._queued.pop(0))
+                continue
             newobject = self._new.pop()
             diag_print ("search from "+str(newobject), "clsolver")
             succes = self._search(newobject)
@@ -475,16 +792,16 @@ class ClusterSolver(Notifier):
         #  - input cluster found -> True
         #  - no more merges -> False
     
-        if len(self._graph.outgoing_vertices("_root")) > 1:
+        if len(self._graph.group("_root")) > 1:
             raise StandardError, "more than one root cluster" 
-        if len(self._graph.outgoing_vertices("_root")) == 1:
-            cluster = self._graph.outgoing_vertices("_root")[0]
+        if len(self._graph.group("_root")) == 1:
+            cluster = list(self._graph.group("_root"))[0]
         else:
             cluster = None
         while (cluster != None):
             if cluster is input_cluster:
                 return True
-            fr = self._graph.outgoing_vertices(cluster)
+            fr = self.find_dependend(cluster)
             me = filter(lambda x: isinstance(x, Merge), fr)
             me = filter(lambda x: cluster in x.outputs(), me)
             if len(me) > 1:
@@ -656,28 +973,19 @@ class ClusterSolver(Notifier):
         """returns Balloon, Rigid or Hedgehog that contains angle(a, b, c)"""
         if a==b or a==c or b==c:
             raise StandardError, "all vars in angle must be different"
-        # get objects dependend on a, b and c
-        dep_a = self._graph.outgoing_vertices(a)
-        dep_b = self._graph.outgoing_vertices(b)
-        dep_c = self._graph.outgoing_vertices(c)
-        dependend = []
-        for obj in dep_a:
-            if obj in dep_b and obj in dep_c:
-                dependend.append(obj)
+        # get top-level clusters containing a, b and c
+        dependend = filter(lambda x: b in x.vars and c in x.vars, self.find_top_level(a))
         # find a hedgehog
         hogs = filter(lambda x: isinstance(x,Hedgehog), dependend)
         hogs = filter(lambda hog: hog.cvar == b, hogs)
-        hogs = filter(lambda x: self.is_top_level(x), hogs)
         if len(hogs) == 1: return hogs[0]
         if len(hogs) > 1: raise "error: angle in more than one hedgehogs"
         # or find a cluster
         clusters = filter(lambda x: isinstance(x,Rigid), dependend)
-        clusters = filter(lambda x: self.is_top_level(x), clusters)
         if len(clusters) == 1: return clusters[0]
         if len(clusters) > 1: raise "error: angle in more than one Rigids"
         # or find a balloon
         balloons = filter(lambda x: isinstance(x,Balloon), dependend)
-        balloons = filter(lambda x: self.is_top_level(x), balloons)
         if len(balloons) == 1: return balloons[0]
         if len(balloons) > 1: raise "error: angle in more than one Balloons"
         # or return None
@@ -125,16 +125,16 @@ class ClusterSolver2D(ClusterSolver):
                     return self._merge_cluster_hog(cluster, hog)
  
     def _search_absorb_from_hog(self, hog):
-        dep = self.find_dependend(hog.cvar)
+        dep = self.find_top_level(hog.cvar)
         # case BH (overconstrained): 
-        balloons = filter(lambda x: isinstance(x,Balloon) and self.is_top_level(x), dep) 
+        balloons = filter(lambda x: isinstance(x,Balloon), dep) 
         sharecx = filter(lambda x: len(Set(hog.xvars).intersection(x.vars)) >=1, balloons) 
         for balloon in sharecx:
             sharedcx = Set(balloon.vars).intersection(hog.xvars)
             if len(sharedcx) == len(hog.xvars):
                 return self._merge_balloon_hog(balloon, hog)
         # case CH (overconstrained)
-        clusters = filter(lambda x: isinstance(x,Rigid) and self.is_top_level(x), dep) 
+        clusters = filter(lambda x: isinstance(x,Rigid), dep) 
         sharecx = filter(lambda x: len(Set(hog.xvars).intersection(x.vars)) >=1, clusters) 
         for cluster in sharecx:
             sharedcx = Set(cluster.vars).intersection(hog.xvars)
@@ -186,9 +186,8 @@ class ClusterSolver2D(ClusterSolver):
     def _search_balloon_from_balloon(self, balloon):
         map = {}    # map from adjacent balloons to variables shared with input balloon
         for var in balloon.vars:
-            deps = self.find_dependend(var)
+            deps = self.find_top_level(var)
             balloons = filter(lambda x: isinstance(x,Balloon), deps)
-            balloons = filter(lambda x: self.is_top_level(x), balloons)
             for bal2 in balloons:
                 if bal2 != balloon:
                     if bal2 in map:
@@ -205,9 +204,8 @@ class ClusterSolver2D(ClusterSolver):
         diag_print("_search_cluster_from_balloon", "clsolver")
         map = {}    # map from adjacent clusters to variables shared with input balloon
         for var in balloon.vars:
-            deps = self.find_dependend(var)
+            deps = self.find_top_level(var)
             clusters = filter(lambda x: isinstance(x,Rigid) or isinstance(x,Distance), deps)
-            clusters = filter(lambda x: self.is_top_level(x), clusters)
             for c in clusters:
                 if c in map:
                     map[c].union_update([var])
@@ -223,9 +221,8 @@ class ClusterSolver2D(ClusterSolver):
         diag_print("_search_balloonclustermerge_from_cluster", "clsolver")
         map = {}    # map from adjacent clusters to variables shared with input balloon
         for var in rigid.vars:
-            deps = self.find_dependend(var)
+            deps = self.find_top_level(var)
             balloons = filter(lambda x: isinstance(x,Balloon), deps)
-            balloons = filter(lambda x: self.is_top_level(x), balloons)
             for b in balloons:
                 if b in map:
                     map[b].union_update([var])
@@ -257,10 +254,9 @@ class ClusterSolver2D(ClusterSolver):
     # ------- DEALING WITH HEDEGHOGS ---------
 
     def _find_hogs(self, cvar):
-        deps = self.find_dependend(cvar)
+        deps = self.find_top_level(cvar)
         hogs = filter(lambda x: isinstance(x,Hedgehog), deps)
         hogs = filter(lambda x: x.cvar == cvar, hogs)
-        hogs = filter(lambda x: self.is_top_level(x), hogs)
         return hogs
 
     def _make_hog_from_cluster(self, cvar, cluster):
@@ -299,7 +295,7 @@ class ClusterSolver2D(ClusterSolver):
                 shared = Set(hog.xvars).intersection(xvars)
                 if len(shared) >= 1 and len(shared) < len(hog.xvars) and len(shared) < len(xvars):
                     tmphog = Hedgehog(cvar, xvars)
-                    if not self._graph.has_vertex(tmphog): 
+                    if not self.contains(tmphog): 
                         newhog = self._make_hog_from_balloon(cvar,newballoon)
                         self._merge_hogs(hog, newhog)
             #end for
@@ -323,7 +319,7 @@ class ClusterSolver2D(ClusterSolver):
                 shared = Set(hog.xvars).intersection(xvars)
                 if len(shared) >= 1 and len(shared) < len(hog.xvars) and len(shared) < len(xvars):
                     tmphog = Hedgehog(cvar, xvars)
-                    if not self._graph.has_vertex(tmphog): 
+                    if not self.contains(tmphog): 
                         newhog = self._make_hog_from_cluster(cvar,newcluster)
                         self._merge_hogs(hog, newhog)
             #end for
@@ -334,8 +330,7 @@ class ClusterSolver2D(ClusterSolver):
         if self.dimension != 2:
             return None
         # find adjacent clusters
-        dep = self.find_dependend(newhog.cvar)
-        top = filter(lambda c: self.is_top_level(c), dep)
+        top = self.find_top_level(newhog.cvar)
         clusters = filter(lambda x: isinstance(x,Rigid), top)
         balloons = filter(lambda x: isinstance(x,Balloon), top)
         hogs = self._find_hogs(newhog.cvar)
@@ -349,7 +344,7 @@ class ClusterSolver2D(ClusterSolver):
             shared = Set(newhog.xvars).intersection(xvars)
             if len(shared) >= 1 and len(shared) < len(xvars) and len(shared) < len(newhog.xvars): 
                 tmphog = Hedgehog(newhog.cvar, xvars)
-                if not self._graph.has_vertex(tmphog): 
+                if not self.contains(tmphog): 
                     newnewhog = self._make_hog_from_cluster(newhog.cvar, cluster)
                     tomerge.append(newnewhog)
         for balloon in balloons:
@@ -359,7 +354,7 @@ class ClusterSolver2D(ClusterSolver):
             shared = Set(newhog.xvars).intersection(xvars)
             if len(shared) >= 1 and len(shared) < len(xvars) and len(shared) < len(newhog.xvars): 
                 tmphog = Hedgehog(newhog.cvar, xvars)
-                if not self._graph.has_vertex(tmphog): 
+                if not self.contains(tmphog): 
                     newnewhog = self._make_hog_from_balloon(newhog.cvar, balloon)
                     tomerge.append(newnewhog)
         for hog in hogs:
@@ -398,8 +393,8 @@ class ClusterSolver2D(ClusterSolver):
     def _search_merge_from_hog(self, hog):
         
         # case CH (overconstrained)
-        dep = self.find_dependend(hog.cvar)
-        clusters = filter(lambda x: isinstance(x,Rigid) and self.is_top_level(x), dep) 
+        dep = self.find_top_level(hog.cvar)
+        clusters = filter(lambda x: isinstance(x,Rigid), dep) 
         sharecx = filter(lambda x: len(Set(hog.xvars).intersection(x.vars)) >=1, clusters) 
         for cluster in sharecx:
             sharedcx = Set(cluster.vars).intersection(hog.xvars)
@@ -416,8 +411,8 @@ class ClusterSolver2D(ClusterSolver):
         # case CCH
         sharex = Set()
         for var in hog.xvars:
-            dep = self.find_dependend(var)
-            sharex.union_update(filter(lambda x: isinstance(x,Rigid) and self.is_top_level(x), dep))
+            dep = self.find_top_level(var)
+            sharex.union_update(filter(lambda x: isinstance(x,Rigid), dep))
         for c1 in sharecx:
             for c2 in sharex:
                 if c1 == c2: continue
@@ -434,12 +429,10 @@ class ClusterSolver2D(ClusterSolver):
         # find clusters overlapping with new cluster
         overlap = {}
         for var in newcluster.vars:
-            # get dependent objects
-            dep = self._graph.outgoing_vertices(var)
-            # only clusters
-            dep = filter(lambda c: self._graph.has_edge("_rigids",c), dep)
-            # only top level
-            dep = filter(lambda c: self.is_top_level(c), dep)
+            # get top level clusters
+            dep = self.find_top_level(var)
+            # only rigids
+            dep = filter(lambda c: isinstance(c, Rigid), dep)
             # remove newcluster
             if newcluster in dep:
                 dep.remove(newcluster)
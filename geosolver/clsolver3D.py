@@ -5,10 +5,11 @@ from sets import Set
 from diagnostic import diag_print, diag_select
 from selconstr import *
 from intersections import *
-from configuration import Configuration
+from configuration import Configuration, SolutionSet
 from cluster import *
 from map import Map
 from gmatch import gmatch
+from imatch import IncrementalMatcher, PatternMatcher
 
 def pattern2graph(pattern):
     """convert pattern to pattern graph"""
@@ -79,6 +80,10 @@ class ClusterSolver3D(ClusterSolver):
     def __init__(self):
         """Instantiate a ClusterSolver3D"""
         ClusterSolver.__init__(self, dimension=3)
+        # incremental matcher for rewrite rules on top-level clusters
+        self._matcher = IncrementalMatcher()
+        for methodclass in _merge_rules():
+            self._matcher.add_rule(methodclass, methodclass.patternmatcher)
          
     # ------------ INTERNALLY USED METHODS --------
 
@@ -94,6 +99,16 @@ class ClusterSolver3D(ClusterSolver):
                 sources.union_update(self._all_sources_constraint_in_cluster(constraint, inp))
             return sources
      
+    # -- top level clusters are matched incrementally
+
+    def _add_top_level(self, object):
+        ClusterSolver._add_top_level(self, object)
+        self._matcher.add(object)
+
+    def _rem_top_level(self, object):
+        ClusterSolver._rem_top_level(self, object)
+        self._matcher.remove(object)
+
     # --------------
     # search methods
     # --------------
@@ -103,9 +118,7 @@ class ClusterSolver3D(ClusterSolver):
         # find all toplevel clusters connected to newcluster via one or more variables
         connected = Set()
         for var in newcluster.vars:
-            dependend = self.find_dependend(var)
-            dependend = filter(lambda x: self.is_top_level(x), dependend)
-            connected.union_update(dependend)
+            connected.union_update(self.find_top_level(var))
         diag_print("search: connected clusters="+str(connected),"clsolver3D")
         # try applying methods
         if self._try_method(connected):
@@ -119,9 +132,7 @@ class ClusterSolver3D(ClusterSolver):
         # find all toplevel clusters connected to newcluster via one or more variables
         connected = Set()
         for var in newcluster.vars:
-            dependend = self.find_dependend(var)
-            dependend = filter(lambda x: self.is_top_level(x), dependend)
-            connected.union_update(dependend)
+            connected.union_update(self.find_top_level(var))
         connected.remove(newcluster)
         #print "connected:", connected
         # make pairs
@@ -184,11 +195,12 @@ class ClusterSolver3D(ClusterSolver):
         """finds a possible rewrite rule applications on given set of clusters, applies it 
            and returns True iff successfull
         """
-        refgraph = reference2graph(nlet)
-        for methodclass in reversed([MergePR, MergeDR, MergeDDD, MergeADD, MergeDAD, MergeAA, MergeSD, MergeTTD, MergeRR]):
-            matches = gmatch(methodclass.patterngraph, refgraph)
-            if len(matches) > 0:
-                diag_print("number of matches = "+str(len(matches)), "clsolver3D")
+        for methodclass in _merge_rules():
+            # matches are generated lazily, so we stop at the first successful match
+            if self._is_matched(nlet):
+                matches = self._matcher.iter_matches(methodclass, nlet)
+            else:
+                matches = methodclass.patternmatcher.iter_matches(nlet)
             for s in matches:
                 # diag_print("try match: "+str(s),"clsolver3D")
                 method = apply(methodclass, [s])
@@ -201,6 +213,13 @@ class ClusterSolver3D(ClusterSolver):
         # end for method
         return False
     
+    def _is_matched(self, nlet):
+        """True iff all clusters in nlet are kept up to date by the incremental matcher"""
+        for cluster in nlet:
+            if not self.is_top_level(cluster):
+                return False
+        return True
+    
     def _add_method_complete(self, merge):
         # diag_print("add_method_complete "+str(merge), "clsolver3D")
         # check that method has one output
@@ -212,9 +231,7 @@ class ClusterSolver3D(ClusterSolver):
         infinc = True
         connected = Set()
         for var in output.vars:
-            dependend = self.find_dependend(var)
-            dependend = filter(lambda x: self.is_top_level(x), dependend)
-            connected.union_update(dependend)
+            connected.union_update(self.find_top_level(var))
         #for cluster in merge.inputs():
         #    if cluster in connected:
         #        connected.remove(cluster)
@@ -261,26 +278,35 @@ class ClusterSolver3D(ClusterSolver):
             overconstrained = overconstrained or cluster.overconstrained
         output.overconstrained = overconstrained
         # add to graph
-        self._add_cluster(output)
-        self._add_method(merge)
-        # remove inputs from top_level
-        merge.restore_toplevel = []    # make restore list in method
-        for cluster in merge.inputs():
-            if num_constraints(cluster.intersection(output)) >= num_constraints(cluster): 
-               diag_print("remove from top-level: "+str(cluster),"clsolver3D")
-               self._rem_top_level(cluster) 
-               merge.restore_toplevel.append(cluster)
-            else:
-               diag_print("keep top-level: "+str(cluster),"clsolver3D")
-        # add prototype selection method
-        self._add_prototype_selector(merge)
-        # add solution selection method
-        self._add_solution_selector(merge)
+        # (merge is executed after the selectors are added, see _add_prototype_selector)
+        self._mg.begin_batch()
+        try:
+            self._add_cluster(output)
+            self._add_method(merge)
+            # remove inputs from top_level
+            merge.restore_toplevel = []    # make restore list in method
+            for cluster in merge.inputs():
+                if num_constraints(cluster.intersection(output)) >= num_constraints(cluster): 
+                   diag_print("remove from top-level: "+str(cluster),"clsolver3D")
+                   self._rem_top_level(cluster) 
+                   merge.restore_toplevel.append(cluster)
+                else:
+                   diag_print("keep top-level: "+str(cluster),"clsolver3D")
+            # add prototype selection method
+            self._add_prototype_selector(merge)
+            # add solution selection method
+            self._add_solution_selector(merge)
+        finally:
+            self._mg.end_batch()
         # pause
         return True
 
 # class ClusterSolver3D
 
+def _merge_rules():
+    """the rewrite rules (merge classes) of ClusterSolver3D, in order of preference"""
+    return reversed([MergePR, MergeDR, MergeDDD, MergeADD, MergeDAD, MergeAA, MergeSD, MergeTTD, MergeRR])
+
 # ----------------------------------------------
 # ---------- Methods for 3D solving -------------
 # ----------------------------------------------
@@ -306,6 +332,7 @@ class MergePR(ClusterMethod):
         return pattern2graph(pattern)
     pattern = staticmethod(_pattern)
     patterngraph = _pattern()
+    patternmatcher = PatternMatcher(patterngraph)
 
     def __str__(self):
         s =  "MergePR("+str(self._inputs[0])+"+"+str(self._inputs[1])+"->"+str(self._outputs[0])+")"
@@ -325,6 +352,9 @@ class MergePR(ClusterMethod):
         else:
             return [conf1.copy()]
 
+    def batch_execute(self, inmap):
+        return _batch_select(self, 1, inmap)
+
 class MergeDR(ClusterMethod):
     """Represents a merging of a distance (two-point cluster) with a rigid
        The first cluster determines the orientation of the resulting cluster
@@ -346,6 +376,7 @@ class MergeDR(ClusterMethod):
         return pattern2graph(pattern)
     pattern = staticmethod(_pattern)
     patterngraph = _pattern()
+    patternmatcher = PatternMatcher(patterngraph)
 
     def __str__(self):
         s =  "MergeDR("+str(self._inputs[0])+"+"+str(self._inputs[1])+"->"+str(self._outputs[0])+")"
@@ -365,6 +396,9 @@ class MergeDR(ClusterMethod):
         else:
             return [conf1.copy()]
 
+    def batch_execute(self, inmap):
+        return _batch_select(self, 2, inmap)
+
 class MergeRR(ClusterMethod):
     """Represents a merging of two rigids sharing three points (overconstrained).
        The first cluster determines the orientation of the resulting cluster
@@ -385,6 +419,7 @@ class MergeRR(ClusterMethod):
         return pattern2graph(pattern)
     pattern = staticmethod(_pattern)
     patterngraph = _pattern()
+    patternmatcher = PatternMatcher(patterngraph)
 
     def __str__(self):
         s =  "MergeRR("+str(self._inputs[0])+"+"+str(self._inputs[1])+"->"+str(self._outputs[0])+")"
@@ -399,6 +434,14 @@ class MergeRR(ClusterMethod):
         conf2 = inmap[c2]
         return [conf1.merge(conf2)]
 
+    def batch_execute(self, inmap):
+        diag_print("MergeRR.batch_execute called","clmethods")
+        sols1 = inmap[self._inputs[0]]
+        sols2 = inmap[self._inputs[1]]
+        if not isinstance(sols1, SolutionSet):
+            return None
+        return sols1.merge_all(sols2)
+
 class MergeDDD(ClusterMethod):
     """Represents a merging of three distances"""
     def __init__(self, map):
@@ -423,6 +466,7 @@ class MergeDDD(ClusterMethod):
         return pattern2graph(pattern)
     pattern = staticmethod(_pattern)
     patterngraph = _pattern()
+    patternmatcher = PatternMatcher(patterngraph)
 
 
     def __str__(self):
@@ -438,9 +482,9 @@ class MergeDDD(ClusterMethod):
         v1 = self.a
         v2 = self.b
         v3 = self.c
-        d12 = distance_2p(c12.get(v1),c12.get(v2))
-        d31 = distance_2p(c13.get(v1),c13.get(v3))
-        d23 = distance_2p(c23.get(v2),c23.get(v3))
+        d12 = distance_2p(c12.get_fast(v1),c12.get_fast(v2))
+        d31 = distance_2p(c13.get_fast(v1),c13.get_fast(v3))
+        d23 = distance_2p(c23.get_fast(v2),c23.get_fast(v3))
         solutions = solve_ddd_3D(v1,v2,v3,d12,d23,d31)
         return solutions
 
@@ -478,6 +522,7 @@ class MergeTTD(ClusterMethod):
         return pattern2graph(pattern)
     pattern = staticmethod(_pattern)
     patterngraph = _pattern()
+    patternmatcher = PatternMatcher(patterngraph)
 
     def multi_execute(self, inmap):
         diag_print("MergeTTD.multi_execute called","clmethods")
@@ -488,12 +533,12 @@ class MergeTTD(ClusterMethod):
         v2 = self.b
         v3 = self.c
         v4 = self.d
-        p1 = c123.get(v1)
-        p2 = c123.get(v2)
-        p3 = c123.get(v3)
-        d14 = distance_2p(c124.get(v1),c124.get(v4))
-        d24 = distance_2p(c124.get(v2),c124.get(v4))
-        d34 = distance_2p(c34.get(v3),c34.get(v4))
+        p1 = c123.get_fast(v1)
+        p2 = c123.get_fast(v2)
+        p3 = c123.get_fast(v3)
+        d14 = distance_2p(c124.get_fast(v1),c124.get_fast(v4))
+        d24 = distance_2p(c124.get_fast(v2),c124.get_fast(v4))
+        d34 = distance_2p(c34.get_fast(v3),c34.get_fast(v4))
         return solve_3p3d(v1,v2,v3,v4,p1,p2,p3,d14,d24,d34)
 
     def prototype_constraints(self):
@@ -526,6 +571,7 @@ class MergeDAD(ClusterMethod):
         return pattern2graph(pattern)
     pattern = staticmethod(_pattern)
     patterngraph = _pattern()
+    patternmatcher = PatternMatcher(patterngraph)
 
     def __str__(self):
         s =  "MergeDAD("+str(self._inputs[0])+"+"+str(self._inputs[1])+"+"+str(self._inputs[2])+"->"+str(self._outputs[0])+")"
@@ -570,6 +616,7 @@ class MergeADD(ClusterMethod):
         return pattern2graph(pattern)
     pattern = staticmethod(_pattern)
     patterngraph = _pattern()
+    patternmatcher = PatternMatcher(patterngraph)
 
     def __str__(self):
         s =  "MergeADD("+str(self._inputs[0])+"+"+str(self._inputs[1])+"+"+str(self._inputs[2])+"->"+str(self._outputs[0])+")"
@@ -612,6 +659,7 @@ class MergeAA(ClusterMethod):
         return pattern2graph(pattern)
     pattern = staticmethod(_pattern)
     patterngraph = _pattern()
+    patternmatcher = PatternMatcher(patterngraph)
 
     def __str__(self):
         s =  "MergeAA("+str(self._inputs[0])+"+"+str(self._inputs[1])+"->"+str(self._outputs[0])+")"
@@ -649,6 +697,7 @@ class MergeSD(ClusterMethod):
         return pattern2graph(pattern)
     pattern = staticmethod(_pattern)
     patterngraph = _pattern()
+    patternmatcher = PatternMatcher(patterngraph)
 
     def __str__(self):
         s =  "MergeSD("+str(self._inputs[0])+"+"+str(self._inputs[1])+"->"+str(self._outputs[0])+")"
@@ -663,6 +712,31 @@ class MergeSD(ClusterMethod):
         conf2 = inmap[c2]
         return [conf1.merge_scale(conf2)]
 
+    def batch_execute(self, inmap):
+        diag_print("MergeSD.batch_execute called","clmethods")
+        sols1 = inmap[self._inputs[0]]
+        sols2 = inmap[self._inputs[1]]
+        if not isinstance(sols1, SolutionSet):
+            return None
+        return sols1.merge_scale_all(sols2)
+
+def _batch_select(method, size, inmap):
+    """batch_execute for MergePR and MergeDR: all solutions of the larger input cluster, 
+       if the smaller input cluster (with the given number of variables) has any solution.
+       Returns a copy, so the input and output clusters do not share a SolutionSet."""
+    c1 = method.inputs()[0]
+    c2 = method.inputs()[1]
+    if len(c1.vars) == size:
+        small, large = inmap[c1], inmap[c2]
+    else:
+        small, large = inmap[c2], inmap[c1]
+    if not isinstance(large, SolutionSet):
+        return None
+    elif len(small) == 0:
+        return SolutionSet()
+    else:
+        return large.copy()
+
 # ---------------------------------------------------------
 # ------- functions to determine configurations  ----------
 # ---------------------------------------------------------
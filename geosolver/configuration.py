@@ -5,7 +5,17 @@ A configuration is a set of named points with coordinates."""
 from sets import Set
 from matfunc import Vec, Mat
 from intersections import *
+from rigid import RigidTransform, apply_all, frame_2d, frame_3d, uniform_scale
 from tolerance import *
+import tolerance
+import array
+import types
+
+# numpy is optional; coordinates are stored in an array.array if not available
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 def perp2D(v):
     w = Vec(v)
@@ -17,9 +27,13 @@ class Configuration:
     """A set of named points with coordinates of a specified dimension. 
     
        Immutable. Defines equality and a hash function. 
+
+       The coordinates are stored in a single N x dimension array (a numpy array, 
+       or a flat array.array if numpy is not available), with a row for each variable, 
+       so transform, add, select and merge operate on all points at once.
     
        Attributes: 
-       map - a dictionary mapping variable names to point values.
+       map - a dictionary mapping variable names to point values (created on demand).
        dimension - the dimension of the space in which the configuration is embedded
        underconstrained - flag indicating an underconstrained merge (not a unique solution)
     """
@@ -32,69 +46,91 @@ class Configuration:
             raise Exception("could not determine dimension of configuration")
         elif self.dimension < 2 or self.dimension > 3:
             raise Exception("no support for "+str(self.dimension)+"-dimensional configurations")
+        self._vars = self.map.keys()
+        """list of variables, in order of rows"""
+        self._index = _make_index(self._vars)
+        """map from variables to rows"""
+        self._coords = _make_coords([self.map[v] for v in self._vars], self.dimension)
+        """coordinates of the points"""
         self.makehash()
 
+    def __getattr__(self, name):
+        # create map on demand 
+        if name == "map":
+            self.map = {}
+            for var in self._vars:
+                self.map[var] = self.get(var)
+            return self.map
+        raise AttributeError, name
+
     def copy(self):
         """returns a shallow copy"""
-        new = Configuration(self.map)
+        new = _from_coords(self._vars, self._index, self._coords, self.dimension)
         new.underconstrained = self.underconstrained
         return new 
 
     def vars(self):
         """return list of variables"""
-        return self.map.keys()
+        return list(self._vars)
 
     def get(self, var):
         """return position of point var"""
-        return self.map[var]
+        return _get_row(self._coords, self._index[var], self.dimension)
+
+    def get_fast(self, var):
+        """return position of point var as a fastvector (see vector.fastvector), 
+           which is faster for arithmetic, but is not a list"""
+        return _get_row(self._coords, self._index[var], self.dimension, vector.fastvector)
 
     def transform(self, t):
-        """returns a new configuration, which is this one transformed by matrix t"""
-        newmap = {}
-        for v in self.map:
-            p = self.map[v]
-            ph = Vec(p)
-            ph.append(1.0)
-            ph = t.mmul(ph)
-            p = vector.vector(ph[0:-1]) / ph[-1]
-            newmap[v] = p
-        return Configuration(newmap)
+        """returns a new configuration, which is this one transformed by t, 
+           a RigidTransform or a homogeneous matrix (Mat)"""
+        if isinstance(t, RigidTransform):
+            coords = t.apply(self._coords)
+        else:
+            coords = _transform(self._coords, t, self.dimension)
+        return _from_coords(self._vars, self._index, coords, self.dimension)
 
     def add(self, c):
         """return a new configuration which is this configuration extended with all points in c not in this configuration"""
-        newmap = {}
-        for v in self.map:
-            newmap[v] = self.map[v]
-        for v in c.map:
-            if v not in newmap:
-                newmap[v] = c.map[v]
-        return Configuration(newmap)
+        new = filter(lambda v: v not in self._index, c._vars)
+        if len(new) == 0:
+            return _from_coords(self._vars, self._index, self._coords, self.dimension)
+        rows = map(lambda v: c._index[v], new)
+        coords = _concat(self._coords, _take(c._coords, rows, c.dimension))
+        vars = self._vars + new
+        return _from_coords(vars, _make_index(vars), coords, self.dimension)
 
     def select(self, vars):
         """return a new configuration that is a subconfiguration of this configuration, containing only the selected variables"""
-        newmap = {}
-        for v in vars:
-            newmap[v] = self.map[v]
-        return Configuration(newmap)
+        vars = list(vars)
+        rows = map(lambda v: self._index[v], vars)
+        coords = _take(self._coords, rows, self.dimension)
+        return _from_coords(vars, _make_index(vars), coords, self.dimension)
     
     def merge(self, other):
         """returns a new configurations which is this one plus the given other configuration transformed, such that common points will overlap (if possible)."""
         t = self.merge_transform(other)
-        othertransformed = other.transform(t)
-        result = self.add(othertransformed)
+        result = self.add(other._transform_new(self, t))
         result.underconstrained = t.underconstrained
         return result
 
     def merge_scale(self, other):
         """returns a new configurations which is this one plus the given other configuration transformed, such that common points will overlap (if possible)."""
         t = self.merge_scale_transform(other)
-        othertransformed = other.transform(t)
-        result = self.add(othertransformed)
+        result = self.add(other._transform_new(self, t))
         result.underconstrained = t.underconstrained
         return result
     
     # NON-PUBLIC
 
+    def _transform_new(self, other, t):
+        """returns the points of this configuration not in other, transformed by matrix t"""
+        new = filter(lambda v: v not in other._index, self._vars)
+        if len(new) == len(self._vars):
+            return self.transform(t)
+        return self.select(new).transform(t)
+
     def merge_transform(self,other):
         if other.dimension != self.dimension:
             raise Exception("cannot merge configurations of different dimensions")
@@ -117,35 +153,35 @@ class Configuration:
         underconstrained = self.underconstrained or other.underconstrained
         if len(shared) == 0:
             underconstrained = True
-            cs1 = make_hcs_2d(vector.vector([0.0,0.0]), vector.vector([1.0,0.0]))
-            cs2 = make_hcs_2d(vector.vector([0.0,0.0]), vector.vector([1.0,0.0]))
+            cs1 = frame_2d(vector.vector([0.0,0.0]), vector.vector([1.0,0.0]))
+            cs2 = frame_2d(vector.vector([0.0,0.0]), vector.vector([1.0,0.0]))
         elif len(shared) == 1:
             if len(self.vars()) > 1 and len(other.vars()) > 1:
                 underconstrained = True
             v1 = list(shared)[0]
-            p11 = self.map[v1]
-            p21 = other.map[v1]
-            cs1 = make_hcs_2d(p11, p11+vector.vector([1.0,0.0]))
-            cs2 = make_hcs_2d(p21, p21+vector.vector([1.0,0.0]))
+            p11 = self.get(v1)
+            p21 = other.get(v1)
+            cs1 = frame_2d(p11, p11+vector.vector([1.0,0.0]))
+            cs2 = frame_2d(p21, p21+vector.vector([1.0,0.0]))
         else:   # len(shared) >= 2:
             v1 = list(shared)[0]
             v2 = list(shared)[1]
-            p11 = self.map[v1]
-            p12 = self.map[v2]
+            p11 = self.get(v1)
+            p12 = self.get(v2)
             if tol_eq(vector.norm(p12-p11),0.0):
                 underconstrained = True
-                cs1 = make_hcs_2d(p11, p11+vector.vector[1.0,0.0])
+                cs1 = frame_2d(p11, p11+vector.vector([1.0,0.0]))
             else:
-                cs1 = make_hcs_2d(p11, p12)
-            p21 = other.map[v1]
-            p22 = other.map[v2]
+                cs1 = frame_2d(p11, p12)
+            p21 = other.get(v1)
+            p22 = other.get(v2)
             if tol_eq(vector.norm(p22-p21),0.0):
                 underconstrained = True
-                cs2 = make_hcs_2d(p21, p21+vector.vector[1.0,0.0])
+                cs2 = frame_2d(p21, p21+vector.vector([1.0,0.0]))
             else:
-                cs2 = make_hcs_2d(p21, p22)
+                cs2 = frame_2d(p21, p22)
         # in any case
-        t = cs_transform_matrix(cs2, cs1)
+        t = cs1.compose(cs2.inverse())
         t.underconstrained = underconstrained
         return t
 
@@ -161,86 +197,88 @@ class Configuration:
 
         v1 = list(shared)[0]
         v2 = list(shared)[1]
-        p11 = self.map[v1]
-        p12 = self.map[v2]
+        p11 = self.get(v1)
+        p12 = self.get(v2)
         if tol_eq(vector.norm(p12-p11),0.0):
             underconstrained = True
-            cs1 = make_hcs_2d_scaled(p11, p11+vector.vector[1.0,0.0])
+            cs1 = frame_2d(p11, p11+vector.vector([1.0,0.0]), True)
         else:
-            cs1 = make_hcs_2d_scaled(p11, p12)
-        p21 = other.map[v1]
-        p22 = other.map[v2]
+            cs1 = frame_2d(p11, p12, True)
+        p21 = other.get(v1)
+        p22 = other.get(v2)
         if tol_eq(vector.norm(p22-p21),0.0):
             underconstrained = True
-            cs2 = make_hcs_2d_scaled(p21, p21+vector.vector[1.0,0.0])
+            cs2 = frame_2d(p21, p21+vector.vector([1.0,0.0]), True)
         else:
-            cs2 = make_hcs_2d_scaled(p21, p22)
+            cs2 = frame_2d(p21, p22, True)
         print cs1, cs2
-        t = cs_transform_matrix(cs2, cs1)
+        t = cs1.compose(cs2.inverse())
         othert = other.transform(t)
         result = self.add(othert)
         result.underconstrained = underconstrained
         return result
 
     def _merge_transform_3D(self, other):
-        """returns a matrix for a rigid transformation 
+        """returns a rigid transformation (RigidTransform)
            such that points in other are mapped onto points in self
         """
         shared = Set(self.vars()).intersection(other.vars())
         underconstrained = self.underconstrained or other.underconstrained
         if len(shared) == 0:
             underconstrained = True
-            cs1 = make_hcs_3d(vector.vector([0.0,0.0,0.0]),
+            cs1 = frame_3d(vector.vector([0.0,0.0,0.0]),
                               vector.vector([0.0,1.0,0.0]),
                               vector.vector([0.0,0.0,1.0]))
-            cs2 = make_hcs_3d(vector.vector([0.0,0.0,0.0]),
+            cs2 = frame_3d(vector.vector([0.0,0.0,0.0]),
                               vector.vector([0.0,1.0,0.0]),
                               vector.vector([0.0,0.0,1.0]))
         elif len(shared) == 1:
             if len(self.vars()) > 1 and len(other.vars()) > 1:
                 underconstrained = True
             v1 = list(shared)[0]
-            p1s = self.map[v1]
-            p1o = other.map[v1]
-            cs1 = make_hcs_3d(p1s, 
+            p1s = self.get(v1)
+            p1o = other.get(v1)
+            cs1 = frame_3d(p1s, 
                               p1s+vector.vector([1.0,0.0,0.0]),
                               p1s+vector.vector([0.0,1.0,0.0]))
-            cs2 = make_hcs_3d(p1o,
+            cs2 = frame_3d(p1o,
                               p1o+vector.vector([1.0,0.0,0.0]),
                               p1o+vector.vector([0.0,1.0,0.0]))
         elif len(shared) == 2:
             if len(self.vars()) > 2 and len(other.vars()) > 2:
                 underconstrained = True
             v1 = list(shared)[0]
-            p1s = self.map[v1]
-            p1o = other.map[v1]
+            p1s = self.get(v1)
+            p1o = other.get(v1)
             v2 = list(shared)[1]
-            p2s = self.map[v2]
-            p2o = other.map[v2]
+            p2s = self.get(v2)
+            p2o = other.get(v2)
             p3s = p1s + vector.cross(p2s-p1s, perp2D(p2s-p1s))
             p3o = p1o + vector.cross(p2o-p1o, perp2D(p2s-p1s))
             if tol_eq(vector.norm(p2s-p1s),0.0):
                 underconstrained = True
-            cs1 = make_hcs_3d(p1s, p2s, p3s)
-            cs2 = make_hcs_3d(p1o, p2o, p3o)
+            if tol_eq(vector.norm(p2o-p1o),0.0):
+                underconstrained = True
+            cs1 = _frame_3d(p1s, p2s, p3s)
+            cs2 = _frame_3d(p1o, p2o, p3o)
         else:   # len(shared) >= 3:
             v1 = list(shared)[0]
             v2 = list(shared)[1]
             v3 = list(shared)[2]
-            p1s = self.map[v1]
-            p2s = self.map[v2]
-            p3s = self.map[v3]
-            cs1 = make_hcs_3d(p1s, p2s, p3s)
+            p1s = self.get(v1)
+            p2s = self.get(v2)
+            p3s = self.get(v3)
+            cs1 = _frame_3d(p1s, p2s, p3s)
             if tol_eq(vector.norm(p2s-p1s),0.0):
                 underconstrained = True
             if tol_eq(vector.norm(p3s-p1s),0.0):
                 underconstrained = True
             if tol_eq(vector.norm(p3s-p2s),0.0):
                 underconstrained = True
-            p1o = other.map[v1]
-            p2o = other.map[v2]
-            p3o = other.map[v3]
-            cs2 = make_hcs_3d(p1o, p2o, p3o)
+            p1o = other.get(v1)
+            p2o = other.get(v2)
+            p3o = other.get(v3)
+            cs2 = _frame_3d(p1o, p2o, p3o)
             if tol_eq(vector.norm(p2o-p1o),0.0):
                 underconstrained = True
             if tol_eq(vector.norm(p3o-p1o),0.0):
@@ -248,7 +286,7 @@ class Configuration:
             if tol_eq(vector.norm(p3o-p2o),0.0):
                 underconstrained = True
         # in any case:
-        t = cs_transform_matrix(cs2, cs1)
+        t = cs1.compose(cs2.inverse())
         t.underconstrained = underconstrained
         return t
 
@@ -260,18 +298,21 @@ class Configuration:
             return self._merge_transform_3D(other)
         elif len(shared) >= 2:
             v1 = list(shared)[0]
-            p1s = self.map[v1]
-            p1o = other.map[v1]
+            p1s = self.get(v1)
+            p1o = other.get(v1)
             v2 = list(shared)[1]
-            p2s = self.map[v2]
-            p2o = other.map[v2]
-            scale = vector.norm(p2s-p1s) / vector.norm(p2o-p1o)
-            scale_trans = pivot_scale_3D(p1o,scale)
+            p2s = self.get(v2)
+            p2o = other.get(v2)
+            if tol_eq(vector.norm(p2o-p1o),0.0):
+                scale = 1.0
+            else:
+                scale = vector.norm(p2s-p1s) / vector.norm(p2o-p1o)
+            scale_trans = uniform_scale(p1o,scale)
             diag_print("scale_trans = "+str(scale_trans),"Configuration.merge_scale_transform_3D")
             merge_trans = self._merge_transform_3D(other)
             diag_print("merge_trans = "+str(merge_trans),"Configuration.merge_scale_transform_3D")
             #merge_scale_trans = scale_trans.mmul(merge_trans)
-            merge_scale_trans = merge_trans.mmul(scale_trans)
+            merge_scale_trans = merge_trans.compose(scale_trans)
             merge_scale_trans.underconstrained = merge_trans.underconstrained
             return merge_scale_trans
 
@@ -279,38 +320,88 @@ class Configuration:
         """two configurations are equal if they map onto eachother modulo rotation and translation"""
         if hash(self) != hash(other):
             return False
-        elif len(self.map) != len(other.map):
+        elif not isinstance(other, Configuration): 
+            return False
+        elif len(self._vars) != len(other._vars):
             return False
         else:
-            if not isinstance(other, Configuration): 
-                return False
-            for var in self.map:
-                if var not in other.map:
+            for var in self._vars:
+                if var not in other._index:
                     return False
             # determine a rotation-translation transformation 
             # to transform other onto self
             t = self.merge_transform(other)
-            othertransformed = other.transform(t)
+            othertransformed = other.transform(t).select(self._vars)
             # test if point map onto eachother (distance metric tolerance)
-            for var in self.map:
-                d = distance_2p(othertransformed.get(var), self.get(var))
-                if tol_gt(d, 0.0):
-                    return False
-            return True 
+            d = _max_distance(othertransformed._coords, self._coords, self.dimension)
+            return not tol_gt(d, 0.0)
     
+    def difference(self, other):
+        """Returns a measure of the difference in shape between this configuration and
+           another configuration (e.g. a prototype), for their shared variables. 
+           The result is a tuple: the number of orientation predicates (the signs of the 
+           areas or volumes of consecutive point triplets or quadruplets, in sorted order) 
+           that differ, followed by the sum of differences of pairwise distances.
+           Both are zero for equal configurations.
+        """
+        vars = filter(lambda v: v in other._index, self._vars)
+        vars.sort()
+        n = len(vars)
+        d = self.dimension
+        coords1 = _take(self._coords, map(lambda v: self._index[v], vars), d)
+        coords2 = _take(other._coords, map(lambda v: other._index[v], vars), d)
+        # orientations
+        differences = 0
+        k = n-d
+        if k > 0:
+            volumes1 = _volumes(_windows(coords1, n, d), d, k)
+            volumes2 = _volumes(_windows(coords2, n, d), d, k)
+            for i in range(k):
+                if tol_eq(volumes1[i], 0.0) or tol_eq(volumes2[i], 0.0):
+                    continue
+                if (volumes1[i] > 0) != (volumes2[i] > 0):
+                    differences += 1
+        # distances
+        return (differences, _distance_difference(coords1, coords2, d))
+
+    def canonical_keys(self):
+        """Returns a list of keys for tolerance-aware hashing. The first key is
+           the canonical key of this configuration, which is invariant under rotation 
+           and translation. It combines the variable names, the quantized sum of 
+           pairwise distances and the chirality (the sign of the area or volume spanned 
+           by the first points). Equal configurations have the same canonical key, 
+           or one of the other keys returned, i.e. the keys of neighbouring buckets.
+        """
+        # the keys depend on the tolerance when they were made
+        if not hasattr(self, "_keys") or self._keys[0] != tolerance.default_tol:
+            self._keys = (tolerance.default_tol, self._make_keys())
+        return self._keys[1]
+
+    def _make_keys(self):
+        vars = list(self._vars)
+        vars.sort()
+        vars = vars[0:self.dimension+1]
+        if len(vars) <= self.dimension:
+            volume = 0.0
+        else:
+            rows = map(lambda v: self._index[v], vars)
+            volume = _volumes(_take(self._coords, rows, self.dimension), self.dimension, 1)[0]
+        distsum = _distance_sums(self._coords, self.dimension, 1)[0]
+        return _canonical_keys(self.hashvalue, len(self._vars), distsum, volume)
+
     def makehash(self):
         """the hash is based only on variable names (not values)"""
         val = 0
-        for var in self.map:
+        for var in self._vars:
             val = val + hash(var) 
         self.hashvalue = hash(val)
 
     def checkdimension(self):
         """returns the dimension of the points, or zero if they are of different dimensions"""
-        var = iter(self.vars()).next()
-        dim = len(self.get(var))
+        var = iter(self.map).next()
+        dim = len(self.map[var])
         for var in self.map:
-            if len(self.get(var)) != dim:
+            if len(self.map[var]) != dim:
                 dim = 0
                 break
         return dim
@@ -321,6 +412,518 @@ class Configuration:
     def __str__(self):
         return "Configuration("+str(self.map)+")"
 
+class SolutionSet:
+    """A set of alternative configurations (solutions) of the same variables.
+
+       The coordinates of all K solutions are stored in a single K x N x d array 
+       (a flat array.array if numpy is not available), with a variable index
+       shared by all solutions. Merge, transform, select and removal of duplicates 
+       are done for all solutions at once. The solutions are available as 
+       Configurations (sharing the array), which are created on demand. 
+
+       Immutable. Equal configurations (see Configuration.__eq__) occur only once.
+    """
+
+    def __init__(self, configurations=[]):
+        """instantiate a SolutionSet from a list of Configurations with the same variables"""
+        configurations = list(configurations)
+        if len(configurations) == 0:
+            self._set_coords([], 0, None, [])
+            return
+        vars = configurations[0].vars()
+        dimension = configurations[0].dimension
+        coords = []
+        for conf in configurations:
+            if conf.dimension != dimension:
+                raise Exception("cannot combine configurations of different dimensions")
+            if len(conf._vars) != len(vars):
+                raise Exception("cannot combine configurations of different variables")
+            if conf._vars == vars:
+                coords.append(conf._coords)
+            else:
+                coords.append(conf.select(vars)._coords)
+        under = map(lambda c: c.underconstrained, configurations)
+        self._set_coords(vars, dimension, _stack(coords, len(vars), dimension), under)
+        # re-use existing configurations
+        self._confs = configurations
+        self._remove_duplicates()
+
+    def _set_coords(self, vars, dimension, coords, under):
+        self._vars = vars
+        """list of variables, in order of rows"""
+        self._index = _make_index(vars)
+        """map from variables to rows"""
+        self.dimension = dimension
+        self._coords = coords
+        """K x N x d coordinates"""
+        self._under = under
+        """underconstrained flag of each solution"""
+        self._confs = [None]*len(under)
+        """configurations, created on demand"""
+
+    def vars(self):
+        """return list of variables"""
+        return list(self._vars)
+
+    def __len__(self):
+        return len(self._under)
+
+    def __getitem__(self, k):
+        """return the k-th solution as a Configuration"""
+        if k < 0:
+            k += len(self)
+        if k < 0 or k >= len(self):
+            raise IndexError, "solution index out of range"
+        conf = self._confs[k]
+        if conf == None:
+            conf = _from_coords(self._vars, self._index, self._solution(k), self.dimension)
+            conf.underconstrained = self._under[k]
+            self._confs[k] = conf
+        return conf
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self[k]
+
+    def __contains__(self, conf):
+        for other in self:
+            if other == conf:
+                return True
+        return False
+
+    def copy(self):
+        """returns a copy, with its own coordinate array"""
+        if self._coords is None:
+            coords = None
+        elif numpy:
+            coords = self._coords.copy()
+        else:
+            coords = array.array('d', self._coords)
+        return _solution_set(self._vars, self.dimension, coords, list(self._under))
+
+    def identical(self, other):
+        """True iff other is a SolutionSet with exactly the same solutions, i.e. the 
+           same variables, coordinates (without tolerance) and flags, in the same order"""
+        if self is other:
+            return True
+        elif not isinstance(other, SolutionSet):
+            return False
+        elif self._vars != other._vars or self._under != other._under or self.dimension != other.dimension:
+            return False
+        elif numpy:
+            return numpy.array_equal(self._coords, other._coords)
+        else:
+            return self._coords == other._coords
+
+    def transform(self, t):
+        """returns a new SolutionSet with all solutions transformed by t, 
+           a RigidTransform or a homogeneous matrix (Mat)"""
+        if isinstance(t, RigidTransform):
+            coords = t.apply(self._coords)
+        else:
+            coords = _transform(self._coords, t, self.dimension)
+        return _solution_set(self._vars, self.dimension, coords, list(self._under))
+
+    def select(self, vars):
+        """return a new SolutionSet with subconfigurations of all solutions, containing only 
+           the selected variables. Note that duplicates are not removed"""
+        vars = list(vars)
+        rows = map(lambda v: self._index[v], vars)
+        if numpy:
+            coords = self._coords[:,rows]
+        else:
+            coords = array.array('d')
+            for k in range(len(self)):
+                coords.extend(_take(self._solution(k), rows, self.dimension))
+        return _solution_set(vars, self.dimension, coords, list(self._under))
+
+    def merge(self, other):
+        """returns a new SolutionSet with each solution merged with the given Configuration, 
+           like Configuration.merge."""
+        if len(self) == 0:
+            return self.copy()
+        new = filter(lambda v: v not in self._index, other._vars)
+        transforms = map(lambda conf: conf.merge_transform(other), self)
+        under = map(lambda t: t.underconstrained, transforms)
+        if len(new) == 0:
+            return _solution_set(self._vars, self.dimension, self._coords, under)
+        d = self.dimension
+        rows = map(lambda v: other._index[v], new)
+        points = _take(other._coords, rows, d)
+        transformed = apply_all(transforms, points)
+        if numpy:
+            coords = numpy.concatenate((self._coords, transformed), axis=1)
+        else:
+            coords = array.array('d')
+            size = len(points)
+            for k in range(len(self)):
+                coords.extend(self._solution(k))
+                coords.extend(transformed[k*size:(k+1)*size])
+        result = _solution_set(self._vars + new, d, coords, under)
+        result._remove_duplicates()
+        return result
+
+    def merge_all(self, others):
+        """returns a new SolutionSet with each solution merged with each of the given 
+           Configurations (e.g. another SolutionSet), like Configuration.merge.
+           All transformed points are computed in one pass per configuration in others."""
+        return self._merge_all(others, Configuration.merge_transform)
+
+    def merge_scale_all(self, others):
+        """like merge_all, but each merge is like Configuration.merge_scale"""
+        return self._merge_all(others, Configuration.merge_scale_transform)
+
+    def _merge_all(self, others, merge_transform):
+        others = list(others)
+        if len(self) == 0 or len(others) == 0:
+            return SolutionSet()
+        new = filter(lambda v: v not in self._index, others[0]._vars)
+        result = None
+        if numpy and merge_transform == Configuration.merge_transform:
+            result = self._merge_frames(others, new)
+        if result == None:
+            result = self._merge_pairs(others, new, merge_transform)
+        result._remove_duplicates()
+        return result
+
+    def _merge_frames(self, others, new):
+        """merge_all for K solutions and M others, using the frames of (at least d) shared
+           points: K + M frames are computed instead of K x M merge transforms.
+           Numpy only. Returns None if any frame is degenerate."""
+        d = self.dimension
+        k = len(self)
+        m = len(others)
+        shared = list(Set(self.vars()).intersection(others[0].vars()))
+        if len(shared) < d:
+            return None
+        (r1, t1) = _frames(self._coords[:, map(lambda v: self._index[v], shared[:d])])
+        ocoords = numpy.array(map(lambda o: o._coords[map(lambda v: o._index[v], shared+new)], others))
+        (r2, t2) = _frames(ocoords[:, :d])
+        if r1 is None or r2 is None:
+            return None
+        # new points of the others, in their own frames, then in the frames of the solutions
+        local = numpy.einsum('mji,mnj->mni', r2, ocoords[:, len(shared):] - t2[:, numpy.newaxis])
+        points = numpy.einsum('kij,mnj->kmni', r1, local) + t1[:, numpy.newaxis, numpy.newaxis]
+        # solution i merged with other j is solution i*m+j
+        base = numpy.repeat(self._coords, m, axis=0)
+        coords = numpy.concatenate((base, points.reshape(k*m, len(new), d)), axis=1)
+        under = []
+        for i in range(k):
+            for other in others:
+                under.append(self._under[i] or other.underconstrained)
+        return _solution_set(self._vars + new, d, coords, under)
+
+    def _merge_pairs(self, others, new, merge_transform):
+        """merge_all with a merge transform for each pair of a solution and another configuration"""
+        d = self.dimension
+        k = len(self)
+        m = len(others)
+        # transformed points and underconstrained flags, for each other configuration 
+        blocks = []
+        under = []
+        for other in others:
+            transforms = map(lambda conf: merge_transform(conf, other), self)
+            under.append(map(lambda t: t.underconstrained, transforms))
+            rows = map(lambda v: other._index[v], new)
+            blocks.append(apply_all(transforms, _take(other._coords, rows, d)))
+        # solution i merged with other j is solution i*m+j
+        under = map(lambda x: under[x%m][x/m], range(k*m))
+        if numpy:
+            base = numpy.repeat(self._coords, m, axis=0)
+            points = numpy.array(blocks).swapaxes(0,1).reshape(k*m, len(new), d)
+            coords = numpy.concatenate((base, points), axis=1)
+        else:
+            coords = array.array('d')
+            size = len(new)*d
+            for i in range(k):
+                for j in range(m):
+                    coords.extend(self._solution(i))
+                    coords.extend(blocks[j][i*size:(i+1)*size])
+        return _solution_set(self._vars + new, d, coords, under)
+
+    def _solution(self, k):
+        """the coordinates of the k-th solution"""
+        if numpy:
+            return self._coords[k]
+        else:
+            size = len(self._vars)*self.dimension
+            return self._coords[k*size:(k+1)*size]
+
+    def _remove_duplicates(self):
+        """remove equal solutions, comparing only solutions with the same canonical keys"""
+        k = len(self)
+        if k <= 1:
+            return
+        d = self.dimension
+        namehash = self[0].hashvalue
+        vars = list(self._vars)
+        vars.sort()
+        vars = vars[0:d+1]
+        distsums = _distance_sums(self._coords, d, k)
+        if len(vars) <= d:
+            volumes = [0.0]*k
+        else:
+            volumes = _volumes(self.select(vars)._coords, d, k)
+        buckets = {}
+        keep = []
+        for i in range(k):
+            keys = _canonical_keys(namehash, len(self._vars), distsums[i], volumes[i])
+            conf = self[i]
+            conf._keys = (tolerance.default_tol, keys)
+            duplicate = False
+            for key in keys:
+                for j in buckets.get(key, []):
+                    if self[j] == conf:
+                        duplicate = True
+                        break
+                if duplicate:
+                    break
+            if not duplicate:
+                if keys[0] in buckets:
+                    buckets[keys[0]].append(i)
+                else:
+                    buckets[keys[0]] = [i]
+                keep.append(i)
+        if len(keep) < k:
+            confs = map(lambda i: self._confs[i], keep)
+            under = map(lambda i: self._under[i], keep)
+            if numpy:
+                coords = self._coords[keep]
+            else:
+                coords = array.array('d')
+                for i in keep:
+                    coords.extend(self._solution(i))
+            self._set_coords(self._vars, d, coords, under)
+            self._confs = confs
+
+    def __repr__(self):
+        return str(self)
+
+    def __str__(self):
+        return "SolutionSet(["+", ".join(map(str, self))+"])"
+
+# construction and operations on coordinate arrays
+
+def _solution_set(vars, dimension, coords, under):
+    """create a SolutionSet from an array of coordinates (without copying)"""
+    new = types.InstanceType(SolutionSet)
+    new._set_coords(vars, dimension, coords, under)
+    return new
+
+def _stack(coords, n, dimension):
+    """stack coordinate arrays of k configurations with n points"""
+    if numpy:
+        if len(coords) == 0:
+            return numpy.zeros((0, n, dimension))
+        return numpy.array(coords)
+    else:
+        result = array.array('d')
+        for c in coords:
+            result.extend(c)
+        return result
+
+def _from_coords(vars, index, coords, dimension):
+    """create a Configuration from an array of coordinates (without copying)"""
+    # note: an instance is created without calling __init__
+    new = types.InstanceType(Configuration)
+    new._vars = vars
+    new._index = index
+    new._coords = coords
+    new.dimension = dimension
+    new.underconstrained = False
+    new.makehash()
+    return new
+
+def _make_index(vars):
+    index = {}
+    for i in range(len(vars)):
+        index[vars[i]] = i
+    return index
+
+def _make_coords(points, dimension):
+    if numpy:
+        return numpy.array(points, dtype=float).reshape((len(points), dimension))
+    else:
+        coords = array.array('d')
+        for p in points:
+            coords.extend(map(float, p))
+        return coords
+
+def _get_row(coords, row, dimension, type=vector.vector):
+    if numpy:
+        return type(coords[row].tolist())
+    else:
+        return type(coords[row*dimension:(row+1)*dimension].tolist())
+
+def _take(coords, rows, dimension):
+    if numpy:
+        return coords[rows]
+    else:
+        result = array.array('d')
+        for row in rows:
+            result.extend(coords[row*dimension:(row+1)*dimension])
+        return result
+
+def _concat(coords1, coords2):
+    if numpy:
+        return numpy.concatenate((coords1, coords2))
+    else:
+        return coords1 + coords2
+
+def _transform(coords, t, dimension):
+    """transform all rows by homogeneous matrix t"""
+    d = dimension
+    if numpy:
+        m = numpy.array(map(list, t))
+        ph = numpy.dot(coords, m[:d,:d].T) + m[:d,d]
+        w = numpy.dot(coords, m[d,:d]) + m[d,d]
+        return ph / w[...,numpy.newaxis]
+    else:
+        m = map(list, t)
+        result = array.array('d')
+        for i in range(0, len(coords), d):
+            p = list(coords[i:i+d]) + [1.0]
+            w = sum(map(lambda x,y: x*y, m[d], p))
+            for j in range(d):
+                result.append(sum(map(lambda x,y: x*y, m[j], p)) / w)
+        return result
+
+def _canonical_keys(namehash, n, distsum, volume):
+    """see Configuration.canonical_keys"""
+    # the sum of distances of equal configurations may differ by a small amount,
+    # so the quantization cell is larger than the maximum difference
+    # (the tolerance may be changed at any time, see tolerance.py)
+    cell = 8*tolerance.default_tol*max(1, n*(n-1)/2)
+    bucket = int(math.floor(distsum / cell))
+    # chirality, 0 if undetermined
+    if tol_eq(volume, 0.0):
+        chiralities = [0,1,-1]
+    elif volume > 0:
+        chiralities = [1,0]
+    else:
+        chiralities = [-1,0]
+    keys = []
+    for c in chiralities:
+        for b in [bucket, bucket-1, bucket+1]:
+            keys.append((namehash, c, b))
+    return keys
+
+def _distance_sums(coords, dimension, k):
+    """the sums of distances between all pairs of points, for k sets of points"""
+    if numpy:
+        coords = coords.reshape((k, -1, dimension))
+        diff = coords[:,:,numpy.newaxis,:] - coords[:,numpy.newaxis,:,:]
+        return (numpy.sum(numpy.sqrt(numpy.sum(diff**2, axis=3)), axis=(1,2)) / 2).tolist()
+    else:
+        n = len(coords) / dimension / k
+        sums = []
+        for s in range(0, len(coords), n*dimension):
+            total = 0.0
+            for i in range(n):
+                for j in range(i+1, n):
+                    d = 0.0
+                    for c in range(dimension):
+                        d += (coords[s+i*dimension+c]-coords[s+j*dimension+c])**2
+                    total += math.sqrt(d)
+            sums.append(total)
+        return sums
+
+def _volumes(coords, dimension, k):
+    """the signed area (2D) or volume (3D) spanned by dimension+1 points, for k sets of points"""
+    if numpy:
+        p = coords.reshape((k, dimension+1, dimension))
+        u = p[:,1] - p[:,0]
+        v = p[:,2] - p[:,0]
+        if dimension == 2:
+            return (u[:,0]*v[:,1] - u[:,1]*v[:,0]).tolist()
+        else:
+            w = p[:,3] - p[:,0]
+            return numpy.sum(numpy.cross(u,v)*w, axis=1).tolist()
+    else:
+        volumes = []
+        size = (dimension+1)*dimension
+        for s in range(0, len(coords), size):
+            p = map(lambda i: vector.vector(coords[s+i*dimension:s+(i+1)*dimension].tolist()), range(dimension+1))
+            if dimension == 2:
+                (u, v) = (p[1]-p[0], p[2]-p[0])
+                volumes.append(u[0]*v[1] - u[1]*v[0])
+            else:
+                volumes.append(vector.dot(vector.cross(p[1]-p[0], p[2]-p[0]), p[3]-p[0]))
+        return volumes
+
+def _windows(coords, n, dimension):
+    """the n-dimension sets of dimension+1 consecutive rows"""
+    rows = []
+    for i in range(n-dimension):
+        rows.extend(range(i, i+dimension+1))
+    return _take(coords, rows, dimension)
+
+def _distance_difference(coords1, coords2, dimension):
+    """sum of the differences of distances between all pairs of rows"""
+    if numpy:
+        diff1 = coords1[:,numpy.newaxis,:] - coords1[numpy.newaxis,:,:]
+        diff2 = coords2[:,numpy.newaxis,:] - coords2[numpy.newaxis,:,:]
+        dist1 = numpy.sqrt(numpy.sum(diff1**2, axis=2))
+        dist2 = numpy.sqrt(numpy.sum(diff2**2, axis=2))
+        return float(numpy.sum(abs(dist1 - dist2))) / 2
+    else:
+        n = len(coords1) / dimension
+        total = 0.0
+        for i in range(n):
+            for j in range(i+1, n):
+                d1 = 0.0
+                d2 = 0.0
+                for c in range(dimension):
+                    d1 += (coords1[i*dimension+c]-coords1[j*dimension+c])**2
+                    d2 += (coords2[i*dimension+c]-coords2[j*dimension+c])**2
+                total += abs(math.sqrt(d1) - math.sqrt(d2))
+        return total
+
+def _frame_3d(a, b, c):
+    """frame_3d(a, b, c), or if a and b coincide, the frame with origin a 
+       and the axes of the global coordinate system"""
+    frame = frame_3d(a, b, c)
+    if frame == None:
+        frame = frame_3d(a, a+vector.vector([1.0,0.0,0.0]), a+vector.vector([0.0,1.0,0.0]))
+    return frame
+
+def _frames(points):
+    """the orthonormal frames of K configurations of d points (a K x d x d numpy array), 
+       like frame_2d and frame_3d: returns rotations (K x d x d) and origins (K x d), 
+       or (None, None) if the points of any configuration do not define a unique frame"""
+    origin = points[:,0]
+    u = points[:,1] - origin
+    length = numpy.sqrt((u*u).sum(axis=1))
+    if numpy.any(length <= tolerance.default_tol):
+        return (None, None)
+    u = u / length[:, numpy.newaxis]
+    if points.shape[2] == 2:
+        r = numpy.array([[u[:,0], -u[:,1]], [u[:,1], u[:,0]]]).transpose(2,0,1)
+    else:
+        w = numpy.cross(u, points[:,2] - origin)
+        length = numpy.sqrt((w*w).sum(axis=1))
+        if numpy.any(length <= tolerance.default_tol):
+            return (None, None)
+        w = w / length[:, numpy.newaxis]
+        v = numpy.cross(w, u)
+        r = numpy.array([u, v, w]).transpose(1,2,0)
+    return (r, origin)
+
+def _max_distance(coords1, coords2, dimension):
+    """the maximum distance between corresponding rows"""
+    if len(coords1) == 0:
+        return 0.0
+    if numpy:
+        return math.sqrt(numpy.max(numpy.sum((coords1 - coords2)**2, axis=1)))
+    else:
+        dmax = 0.0
+        for i in range(0, len(coords1), dimension):
+            d = 0.0
+            for j in range(i, i+dimension):
+                d += (coords1[j]-coords2[j])**2
+            dmax = max(dmax, d)
+        return math.sqrt(dmax)
+
 
 def test():
     p1 = vector.vector([0.0,0.0,0.0])
@@ -332,5 +935,22 @@ def test():
     q3 = vector.vector([0.0,-1.0,0.0])
     c2 = Configuration({1:q1,2:q2})
     print c1 == c2
+    c3 = Configuration({1:p1,2:p2,3:p3})
+    c4 = Configuration({1:q1,2:q2,3:q3})
+    print c3 == c4, c3.canonical_keys()[0], c4.canonical_keys()[0]
+    p4 = vector.vector([0.0,0.0,1.0])
+    q4 = vector.vector([0.0,0.0,-1.0])
+    s = SolutionSet([Configuration({1:p1,2:p2,3:p3,4:p4}), Configuration({1:p1,2:p2,3:p3,4:q4}), 
+                     Configuration({1:q1,2:q2,3:p3,4:p4})])
+    print len(s), "solutions"
+    print s.merge(Configuration({4:p1,5:p2}))
+    # keys follow a change of the tolerance
+    c5 = Configuration({1:p1,2:p2,3:p3,4:p4})
+    c6 = Configuration({1:p1,2:p2,3:p3,4:p4+vector.vector([0.0,0.0,1e-4])})
+    c5.canonical_keys()
+    old = tolerance.default_tol
+    tolerance.default_tol = 1e-3
+    print c5 == c6, len(SolutionSet([c5, c6])), "solution"
+    tolerance.default_tol = old
 
 if __name__ == "__main__": test()
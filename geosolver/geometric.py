@@ -2,11 +2,12 @@
 problems incrementally."""
 
 import vector
-from clsolver import PrototypeMethod, is_information_increasing
+from clsolver import PrototypeMethod, TrackingScore, is_information_increasing
 from clsolver2D import ClusterSolver2D 
 from clsolver3D import ClusterSolver3D 
 from cluster import Rigid, Hedgehog
 from configuration import Configuration 
+from budget import Budget
 import math
 from diagnostic import diag_print
 from constraint import Constraint, ConstraintGraph
@@ -63,6 +64,36 @@ class GeometricProblem (Notifier, Listener):
         else:
             raise StandardError, "unknown point variable"
 
+    def update(self, points=None, parameters=None):
+        """Change several prototype points and constraint parameters at once.
+           
+           keyword args
+            points      - a dictionary mapping point variables to positions
+            parameters  - a dictionary mapping ParametricConstraints to values
+
+           Listeners (e.g. GeometricSolver) are notified of all changes within 
+           a batch, so the changes are propagated once. 
+        """
+        if points == None:
+            points = {}
+        if parameters == None:
+            parameters = {}
+        for variable in points:
+            if variable not in self.prototype:
+                raise StandardError, "unknown point variable"
+        constraints = self.cg.constraints()
+        for con in parameters:
+            if con not in constraints or not isinstance(con, ParametricConstraint):
+                raise StandardError, "no parametric constraint "+str(con)+" in problem."
+        self.send_notify(("begin_batch", None))
+        try:
+            for variable in points:
+                self.set_point(variable, points[variable])
+            for con in parameters:
+                con.set_parameter(parameters[con])
+        finally:
+            self.send_notify(("end_batch", None))
+
     def get_point(self, variable):
         """get prototype position of point variable"""
         if variable in self.prototype:
@@ -215,11 +246,20 @@ class GeometricSolver (Listener):
 
     # public methods
 
-    def __init__(self, problem):
+    def __init__(self, problem, deferred=True, beam=None, deadline=None, max_solutions=None, token=None, structure_only=False):
         """Create a new GeometricSolver instance
         
            keyword args
             problem        - the GeometricProblem instance to be monitored for changes
+            deferred       - if True, the problem is loaded in a single batch 
+                             (see begin_batch)
+            beam           - if not None, the beam width (see set_beam)
+            deadline       - if not None, the time (see time.time) after which 
+                             solving stops (see set_limits)
+            max_solutions  - if not None, the maximum number of solutions per cluster
+            token          - if not None, a CancelToken to stop solving
+            structure_only - if True, only the decomposition is determined
+                             (see set_structure_only)
         """
         # init superclasses
         Listener.__init__(self)
@@ -235,8 +275,12 @@ class GeometricSolver (Listener):
         else:
             raise StandardError, "Do not know how to solve problems of dimension > 3."
         self._map = {}
+        # beam width, and score function when tracking (see set_tracking)
+        self._beam = beam
+        self._tracking = None
 
         # register 
+        self.problem.add_listener(self)
         self.cg.add_listener(self)
         self.dr.add_listener(self)
 
@@ -244,7 +288,18 @@ class GeometricSolver (Listener):
         self.fixvars = []
         self.fixcluster = None
 
+        if beam != None:
+            self.dr.set_beam(beam)
+        if max_solutions != None:
+            self.dr.set_max_solutions(max_solutions)
+        if deadline != None or token != None:
+            self.dr.set_budget(Budget(deadline, token))
+        if structure_only:
+            self.dr.set_lazy(True)
+
         # map current cg
+        if deferred:
+            self.begin_batch()
         for var in self.cg.variables():
             self._add_variable(var)
             
@@ -258,13 +313,117 @@ class GeometricSolver (Listener):
             if not isinstance(con, DistanceConstraint): 
                 self._add_constraint(con)
 
+        if deferred:
+            self.end_batch()
+
+    def begin_batch(self):
+        """Start a batch of changes. Until the matching end_batch, changes
+           in the problem are recorded, but the problem is not decomposed and 
+           configurations are not propagated. Batches may be nested.
+        """
+        self.dr.begin_batch()
+
+    def end_batch(self):
+        """End a batch of changes; decompose and propagate all changes at once."""
+        self.dr.end_batch()
+        self._track()
+
+    def batch(self):
+        """Returns a context manager for a batch of changes, e.g.
+           
+           with solver.batch():
+               problem.add_constraint(...)
+               ...
+        """
+        return _Batch(self)
+
+    def set_beam(self, width):
+        """Keep at most width solutions for each cluster: those that best match 
+           the prototype points, i.e. with the fewest different orientations and 
+           the smallest difference in distances. If width is None (default), 
+           all solutions are kept. In tracking mode, the beam width takes effect 
+           when tracking is disabled.
+        """
+        self._beam = width
+        if self._tracking == None:
+            self.dr.set_beam(width)
+
+    def set_limits(self, deadline=None, max_solutions=None, token=None):
+        """Limit solving, so a hard problem cannot block indefinitely. 
+
+           Solving stops after the deadline (a time, see time.time) or when the 
+           CancelToken is cancelled. The token is checked cooperatively, before each 
+           search step and method execution. At most max_solutions solutions are 
+           computed for each cluster. If solving stops, or solutions are dropped, the 
+           results are partial, as indicated by the status of the clusters returned 
+           by get_result. Setting new limits resumes solving. 
+        """
+        self.dr.set_max_solutions(max_solutions)
+        if deadline != None or token != None:
+            self.dr.set_budget(Budget(deadline, token))
+        else:
+            self.dr.set_budget(None)
+
+    def set_tracking(self, enabled, solution=None):
+        """Enable or disable tracking mode, for interactive editing (e.g. dragging).
+
+           In tracking mode, only one solution is computed for each cluster: the one 
+           closest to the previously chosen solution, i.e. with the fewest different
+           orientations and the smallest difference in distances. So, after a change,
+           only one branch is followed at each merge. If that yields no solution, all 
+           solutions are enumerated once, and the closest one is chosen instead.
+
+           The initially chosen solution is given as a map from variables to points 
+           (e.g. one of the solutions of get_result), or else it is the first solution 
+           of each top-level cluster.
+        """
+        if enabled:
+            if solution != None:
+                chosen = [Configuration(solution)]
+            else:
+                chosen = self._chosen()
+                if chosen == None:
+                    chosen = []
+            self._tracking = TrackingScore(chosen)
+            self.dr.set_beam(1, self._tracking)
+            self._track()
+        elif self._tracking != None:
+            self._tracking = None
+            self.dr.set_beam(self._beam)
+
+    def is_tracking(self):
+        """True iff tracking mode is enabled (see set_tracking)"""
+        return self._tracking != None
+
+    def set_structure_only(self, enabled):
+        """If enabled, the problem is decomposed into clusters, but no solutions
+           are computed until they are requested, e.g. by get_result. Then only 
+           the solutions of the requested clusters, and of the clusters they
+           depend on, are computed. In this mode, get_constrainedness is based 
+           on the decomposition only. If disabled, all solutions are computed now.
+        """
+        self.dr.set_lazy(enabled)
+
     def get_constrainedness(self):
+        """Returns "well-constrained", "under-constrained", "over-constrained", 
+           "unsolved" or "error". In structure-only mode (see set_structure_only),
+           incidental over-constrainedness (no solutions) is not detected, and 
+           structural over-constrainedness is (see get_structural_constrainedness).
+           If solving was interrupted (see set_limits), returns "unsolved".
+        """
+        if self.dr.interrupted() != None:
+            return "unsolved"
         toplevel = self.dr.top_level()
         if len(toplevel) > 1:
             return "under-constrained"
         elif len(toplevel) == 1:
             cluster = toplevel[0]
-            if isinstance(cluster,Rigid):
+            if isinstance(cluster,Rigid) and self.dr.is_lazy():
+                if cluster.overconstrained:
+                    return "over-constrained"
+                else:
+                    return "well-constrained"
+            elif isinstance(cluster,Rigid):
                 configurations = self.dr.get(cluster)
                 if configurations == None:
                     return "unsolved"
@@ -277,9 +436,38 @@ class GeometricSolver (Listener):
         elif len(toplevel) == 0:
             return "error"
 
-    def get_result(self):
-        """returns the result as a GeometricCluster"""
+    def get_structural_constrainedness(self):
+        """Returns "well-constrained", "under-constrained", "over-constrained", 
+           "unsolved" or "error", determined from the decomposition only, i.e. without 
+           looking at solutions. The answer is the same in every mode. 
+           If solving was interrupted, returns "unsolved".
+        """
+        if self.dr.interrupted() != None:
+            return "unsolved"
+        toplevel = self.dr.top_level()
+        if len(toplevel) > 1:
+            return "under-constrained"
+        elif len(toplevel) == 1:
+            cluster = toplevel[0]
+            if isinstance(cluster,Rigid) and cluster.overconstrained:
+                return "over-constrained"
+            elif isinstance(cluster,Rigid):
+                return "well-constrained"
+            else:
+                return "under-constrained"
+        elif len(toplevel) == 0:
+            return "error"
+
+    def get_result(self, lazy=False):
+        """returns the result as a GeometricCluster. 
+        
+           If lazy is True, the solutions of each cluster are a LazySolutions 
+           sequence, so solutions are only computed when needed. In that case, 
+           the flags are determined from the first solution only.
+        """
         map = {}   
+        interrupted = self.dr.interrupted()
+        space = None
         # map dr clusters
         for drcluster in self.dr.rigids():
             # create geo cluster and map to drcluster (and vice versa)
@@ -290,22 +478,45 @@ class GeometricSolver (Listener):
             for var in drcluster.vars:
                 geocluster.variables.append(var)
             # determine solutions
-            solutions = self.dr.get(drcluster)
             underconstrained = False
-            if solutions != None:
-                for solution in solutions:
-                    geocluster.solutions.append(solution.map)
-                    if solution.underconstrained:
-                        underconstrained = True
+            nosolutions = True
+            if lazy:
+                # the spaces share computed configurations
+                if space == None:
+                    space = self.dr.solution_space(drcluster)
+                else:
+                    space = space.space(drcluster)
+                geocluster.solutions = LazySolutions(space)
+                for solution in geocluster.solutions.configurations():
+                    underconstrained = solution.underconstrained
+                    nosolutions = False
+                    break
+            else:
+                solutions = self.dr.get(drcluster)
+                if solutions != None:
+                    for solution in solutions:
+                        geocluster.solutions.append(solution.map)
+                        nosolutions = False
+                        if solution.underconstrained:
+                            underconstrained = True
             # determine flag
             if drcluster.overconstrained:
                 geocluster.flag = GeometricCluster.S_OVER
-            elif len(geocluster.solutions) == 0:
+            elif interrupted != None and self.dr.get(drcluster) == None:
+                geocluster.flag = GeometricCluster.UNSOLVED
+            elif nosolutions:
                 geocluster.flag = GeometricCluster.I_OVER
             elif underconstrained:
                 geocluster.flag = GeometricCluster.I_UNDER
             else:
                 geocluster.flag = GeometricCluster.OK
+            # determine status
+            if interrupted == Budget.DEADLINE:
+                geocluster.status = GeometricCluster.DEADLINE
+            elif interrupted == Budget.CANCELLED:
+                geocluster.status = GeometricCluster.CANCELLED
+            elif self.dr.limited(drcluster):
+                geocluster.status = GeometricCluster.LIMITED
                 
         # determine subclusters
         for method in self.dr.methods():
@@ -335,7 +546,11 @@ class GeometricSolver (Listener):
             result.variables = []
             result.subs = []
             result.solutions = []
-            result.flags = GeometricCluster.UNSOLVED
+            result.flag = GeometricCluster.UNSOLVED
+            if interrupted == Budget.DEADLINE:
+                result.status = GeometricCluster.DEADLINE
+            elif interrupted == Budget.CANCELLED:
+                result.status = GeometricCluster.CANCELLED
         elif len(rigids) == 1:
             # structurally well constrained
             result = map[rigids[0]]
@@ -345,6 +560,8 @@ class GeometricSolver (Listener):
             result.flag = GeometricCluster.S_UNDER
             for rigid in rigids:
                 result.subs.append(map[rigid])
+                if map[rigid].status != GeometricCluster.COMPLETE:
+                    result.status = map[rigid].status
         return result 
 
     def receive_notify(self, object, message):
@@ -361,14 +578,24 @@ class GeometricSolver (Listener):
                 self._rem_variable(data)
             else:
                 raise StandardError, "unknown message type"+str(type)
+            self._track()
         elif object == self.problem:
             (type, data) = message
             if type == "set_point":
                 (variable, point) = data
                 self._update_variable(variable) 
+                self._track()
             elif type == "set_parameter":
                 (constraint, value) = data
                 self._update_constraint(constraint)
+                self._track()
+            elif type == "begin_batch":
+                self.begin_batch()
+            elif type == "end_batch":
+                self.end_batch()
+            elif type == "add_selection_constraint" or type == "rem_selection_constraint":
+                # selection constraints are not supported by the cluster solver
+                pass
             else:
                 raise StandardError, "unknown message type"+str(type)
         elif object == self.dr:
@@ -378,6 +605,42 @@ class GeometricSolver (Listener):
     
     # internal methods
 
+    def _chosen(self):
+        """the first solution of each top-level rigid, or None if one has no solutions"""
+        chosen = []
+        for cluster in self.dr.top_level():
+            if isinstance(cluster, Rigid):
+                solutions = self.dr.get(cluster)
+                if solutions == None or len(solutions) == 0:
+                    return None
+                chosen.append(solutions[0])
+        return chosen
+
+    def _track(self):
+        """In tracking mode, remember the chosen solutions. If the tracked branch 
+           was lost, enumerate all solutions and choose the closest."""
+        if self._tracking == None or self.dr.in_batch():
+            return
+        chosen = self._chosen()
+        if chosen == None:
+            diag_print("tracked solution lost, enumerating all solutions", "gcs")
+            previous = self._tracking.tracked()
+            self.dr.set_beam(None)
+            closest = []
+            for cluster in self.dr.top_level():
+                solutions = self.dr.get(cluster)
+                if isinstance(cluster, Rigid) and solutions != None and len(solutions) > 0:
+                    closest.append(min(solutions, key=self._tracking))
+            if len(closest) > 0:
+                self._tracking.track(closest + previous)
+            self.dr.set_beam(1, self._tracking)
+            chosen = self._chosen()
+        if chosen != None:
+            self._tracking.track(chosen)
+        else:
+            # no solutions at all; keep tracking the previous solution
+            self._tracking.track(previous)
+
     def _add_variable(self, var):
         if var not in self._map:
             rigid = Rigid([var])
@@ -504,9 +767,56 @@ class GeometricSolver (Listener):
    
 #class GeometricSolver
 
+class _Batch:
+    """Context manager for GeometricSolver batches"""
+
+    def __init__(self, solver):
+        self.solver = solver
+
+    def __enter__(self):
+        self.solver.begin_batch()
+        return self.solver
+
+    def __exit__(self, type, value, traceback):
+        self.solver.end_batch()
+        return False
+
 
 # ------------ GeometricCluster -------------
 
+class LazySolutions:
+    """A sequence of solutions of a GeometricCluster, that are computed when 
+       needed (see GeometricSolver.get_result). Each solution is a dictionary 
+       mapping variable names to vectors. Iteration gives the distinct 
+       solutions. The number of solutions is not known without iterating; 
+       count_bound gives an upper bound. Solutions can be indexed up to that 
+       bound; indices without a solution give None (see SolutionSpace).
+    """
+
+    def __init__(self, space):
+        self._space = space
+
+    def count_bound(self):
+        """an upper bound on the number of solutions (a long integer)"""
+        return self._space.count_bound()
+
+    def __getitem__(self, i):
+        conf = self._space.value(i)
+        if conf == None:
+            return None
+        return conf.map
+
+    def __iter__(self):
+        for conf in self._space:
+            yield conf.map
+
+    def configurations(self):
+        """iterate over solutions as Configurations"""
+        return iter(self._space)
+
+    def __str__(self):
+        return "LazySolutions(at most "+str(self.count_bound())+" solutions)"
+
 class GeometricCluster:
     """Represents the result of solving a GeometricProblem. A cluster is a list of 
        point variable names and a list of solutions for
@@ -527,6 +837,13 @@ class GeometricCluster:
                               S_OVER                structural overconstrained 
                               S_UNDER               structural underconstrained
                               UNSOLVED              unsolved
+            status          - value                 meaning
+                              COMPLETE              all solutions were computed
+                              LIMITED               solutions were dropped (see max_solutions)
+                              DEADLINE              solving stopped at the deadline; 
+                                                    solutions may be missing or out of date
+                              CANCELLED             solving was cancelled; 
+                                                    solutions may be missing or out of date
        """
 
     OK = "well constrained"
@@ -535,6 +852,10 @@ class GeometricCluster:
     S_OVER = "structral over-constrained"
     S_UNDER = "structural under-constrained"
     UNSOLVED = "unsolved"
+    COMPLETE = "complete"
+    LIMITED = "solutions limited"
+    DEADLINE = "deadline exceeded"
+    CANCELLED = "cancelled"
    
     def __init__(self):
         """initialise an empty new cluster"""
@@ -542,6 +863,7 @@ class GeometricCluster:
         self.solutions = []
         self.subs = []
         self.flag = GeometricCluster.OK
+        self.status = GeometricCluster.COMPLETE
 
     def __str__(self):
         return self._str_recursive()
@@ -569,7 +891,14 @@ class GeometricCluster:
             s = s + spaces + "|...\n" 
 
         # pritn cluster
-        s = spaces + "cluster " + str(result.variables) + " " + str(result.flag) + " " + str(len(result.solutions)) + " solutions\n" + s
+        if isinstance(result.solutions, LazySolutions):
+            nsolutions = "at most " + str(result.solutions.count_bound())
+        else:
+            nsolutions = str(len(result.solutions))
+        if result.status != GeometricCluster.COMPLETE:
+            s = spaces + "cluster " + str(result.variables) + " " + str(result.flag) + " " + nsolutions + " solutions (" + str(result.status) + ")\n" + s
+        else:
+            s = spaces + "cluster " + str(result.variables) + " " + str(result.flag) + " " + nsolutions + " solutions\n" + s
         
         return s
     # def
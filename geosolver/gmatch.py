@@ -12,24 +12,30 @@ def gmatch(pattern, reference):
        Returns a list of solutions. 
        Each solution is a Map from pattern vertices to reference vertices (and vice versa).
     """
+    return list(gmatch_iter(pattern, reference))
+#gmatch
+
+def gmatch_iter(pattern, reference):
+    """Match pattern graph to reference graph, like gmatch, but returns an
+       iterator that yields solutions one at a time. 
+       
+       Partial solutions are extended depth-first, so only one partial
+       solution is kept in memory. Each yielded solution is a new dictionary.
+    """
 
     if not isinstance(pattern, FanGraph):
         pattern = FanGraph(pattern)
     if not isinstance(reference, FanGraph):
         reference = FanGraph(reference)
 
-
     # For each pattern vertex:
     #  match with all vertices in reference that have at least same fanin and fanout.
     #  also match if pattern vertex in reference (same object or equal)
-    #  Then combine matches (patvar, refvar) with existing partial solutions if:
-    #    refvar still free in partial solution
-    #    all edges adjacent to pattern vertex are also in reference graph
-
-    solutions = None
-    for patvar in pattern.vertices():
+    order = _match_order(pattern, reference)
+    candidates = {}
+    for patvar in order:
         if reference.has_vertex(patvar):
-            matches = [patvar]
+            candidates[patvar] = [patvar]
         else:
             fanin = pattern.fanin(patvar)
             fanout = pattern.fanout(patvar)
@@ -41,45 +47,73 @@ def gmatch(pattern, reference):
             outmatches = []
             for n in onumbers:
                 outmatches += reference.outfan(n)
-            matches = Set(inmatches).intersection(outmatches)
-        newsolutions = []
-        if solutions == None:
-            for refvar in matches:
-                s = {patvar:refvar, refvar:patvar}
-                newsolutions.append(s)
-        else:
-            for refvar in matches:
-                for olds in solutions:
-                    news = dict(olds)
-                    news[patvar] = refvar
-                    news[refvar] = patvar
-                    consistent = True
-                    # check for no double assignments
-                    if patvar in olds:
-                        if olds[patvar] != refvar:
-                            consistent = False
-                    if refvar in olds:
-                        if olds[refvar] != patvar:
-                            consistent = False
-                    # check edges
-                    for pe in pattern.adjacent_edges(patvar):
-                        (pv1,pv2) = pe
-                        if pv1 not in news or pv2 not in news:
-                            continue
-                        rv1 = news[pv1] 
-                        rv2 = news[pv2] 
-                        if not reference.has_edge(rv1,rv2):
-                            consistent = False
-                            break
-                    if consistent:
-                        newsolutions.append(news)
-                #for
-            #for
-        #if
-        solutions = newsolutions
-    #for
-    return solutions
-#gmatch
+            candidates[patvar] = list(Set(inmatches).intersection(outmatches))
+    # Then extend the partial solution with matches (patvar, refvar) if:
+    #    refvar still free in partial solution
+    #    all edges adjacent to pattern vertex are also in reference graph
+    if len(order) == 0:
+        return iter([])
+    return _extend(pattern, reference, order, 0, candidates, {})
+#gmatch_iter
+
+def _match_order(pattern, reference):
+    """order pattern vertices such that vertices matched exactly come first 
+       and following vertices are adjacent to earlier vertices where possible.
+    """
+    vertices = pattern.vertices()
+    todo = filter(lambda v: not reference.has_vertex(v), vertices)
+    order = filter(lambda v: reference.has_vertex(v), vertices)
+    placed = Set(order)
+    while len(todo) > 0:
+        next = todo[0]
+        for v in todo:
+            adjacent = pattern.outgoing_vertices(v) + pattern.ingoing_vertices(v)
+            if len(placed.intersection(adjacent)) > 0:
+                next = v
+                break
+        todo.remove(next)
+        order.append(next)
+        placed.add(next)
+    return order
+
+def _extend(pattern, reference, order, index, candidates, solution):
+    """depth-first extension of a partial solution"""
+    patvar = order[index]
+    for refvar in candidates[patvar]:
+        # check for no double assignments
+        if patvar in solution and solution[patvar] != refvar:
+            continue
+        if refvar in solution and solution[refvar] != patvar:
+            continue
+        # assign (remember old values for backtracking)
+        saved = []
+        for key in (patvar, refvar):
+            if key in solution:
+                saved.append((key, solution[key]))
+        solution[patvar] = refvar
+        solution[refvar] = patvar
+        # check edges
+        consistent = True
+        for pe in pattern.adjacent_edges(patvar):
+            (pv1,pv2) = pe
+            if pv1 not in solution or pv2 not in solution:
+                continue
+            if not reference.has_edge(solution[pv1], solution[pv2]):
+                consistent = False
+                break
+        if consistent:
+            if index == len(order)-1:
+                yield dict(solution)
+            else:
+                for s in _extend(pattern, reference, order, index+1, candidates, solution):
+                    yield s
+        # backtrack
+        del solution[patvar]
+        if refvar in solution:
+            del solution[refvar]
+        for (key, value) in saved:
+            solution[key] = value
+#_extend
 
 
 def test():
@@ -113,6 +147,7 @@ def test():
     print s
     print len(s),"solutions"
 
+    print "first solution:", gmatch_iter(pattern, reference).next()
 
     print "mathing random pattern in random graph"
     pattern = random_graph(3,6,False,"v")
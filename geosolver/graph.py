@@ -652,6 +652,161 @@ class FanGraph(Graph):
 # end class FanGraph
 
 
+class RelationGraph:
+    """A set of vertices, with typed relations (directed edges) between 
+       vertices and named groups of vertices. 
+      
+       Each relation type has its own adjacency dictionaries (and reverse), so
+       the vertices related to a vertex in one relation are found without
+       looking at the edges of other relations. Groups are Sets of vertices. 
+       Vertices are added implicitly when they are related or added to a group.
+    """
+
+    def __init__(self, relations=[], groups=[]):
+        self._vertices = {}
+        """the set of vertices (a dictionary used as a set)"""
+        self._out = {}
+        """per relation, a dictionary of dictionaries for outgoing edges"""
+        self._in = {}
+        """per relation, a dictionary of dictionaries for ingoing edges"""
+        self._groups = {}
+        """map from group names to Sets of vertices"""
+        for relation in relations:
+            self._add_relation_type(relation)
+        for group in groups:
+            self._groups[group] = Set()
+
+    def _add_relation_type(self, relation):
+        if relation not in self._out:
+            self._out[relation] = {}
+            self._in[relation] = {}
+
+    # -- vertices
+
+    def add_vertex(self, v):
+        "Add vertex if not already."
+        self._vertices[v] = True
+
+    def has_vertex(self, v):
+        "True if v is a vertex."
+        return v in self._vertices
+
+    def rem_vertex(self, v):
+        "Remove vertex, incident edges in all relations and group memberships."
+        if v not in self._vertices:
+            raise StandardError, "vertex not in graph"
+        for relation in self._out:
+            out = self._out[relation]
+            inn = self._in[relation]
+            if v in out:
+                for w in out[v]:
+                    del inn[w][v]
+                    if len(inn[w]) == 0: del inn[w]
+                del out[v]
+            if v in inn:
+                for u in inn[v]:
+                    del out[u][v]
+                    if len(out[u]) == 0: del out[u]
+                del inn[v]
+        for group in self._groups.values():
+            group.discard(v)
+        del self._vertices[v]
+
+    def vertices(self):
+        "List of vertices."
+        return self._vertices.keys()
+
+    # -- relations
+
+    def add_edge(self, relation, v1, v2):
+        "Add an edge of given relation type from v1 to v2."
+        self._add_relation_type(relation)
+        self.add_vertex(v1)
+        self.add_vertex(v2)
+        out = self._out[relation]
+        if v1 not in out:
+            out[v1] = {}
+        out[v1][v2] = True
+        inn = self._in[relation]
+        if v2 not in inn:
+            inn[v2] = {}
+        inn[v2][v1] = True
+
+    def rem_edge(self, relation, v1, v2):
+        "Remove an edge of given relation type."
+        if not self.has_edge(relation, v1, v2):
+            raise StandardError, "edge not in graph"
+        out = self._out[relation]
+        inn = self._in[relation]
+        del out[v1][v2]
+        if len(out[v1]) == 0: del out[v1]
+        del inn[v2][v1]
+        if len(inn[v2]) == 0: del inn[v2]
+
+    def has_edge(self, relation, v1, v2):
+        "True if there is an edge of given relation type from v1 to v2."
+        if relation in self._out and v1 in self._out[relation]:
+            return v2 in self._out[relation][v1]
+        return False
+
+    def outgoing_vertices(self, relation, v):
+        "List of vertices w with an edge (v,w) of given relation type."
+        if relation in self._out and v in self._out[relation]:
+            return self._out[relation][v].keys()
+        return []
+
+    def ingoing_vertices(self, relation, v):
+        "List of vertices u with an edge (u,v) of given relation type."
+        if relation in self._in and v in self._in[relation]:
+            return self._in[relation][v].keys()
+        return []
+
+    # -- groups
+
+    def add_to_group(self, group, v):
+        "Add vertex to named group (and to the graph if not already)."
+        self.add_vertex(v)
+        if group not in self._groups:
+            self._groups[group] = Set()
+        self._groups[group].add(v)
+
+    def rem_from_group(self, group, v):
+        "Remove vertex from named group. The vertex remains in the graph."
+        if not self.in_group(group, v):
+            raise StandardError, "vertex not in group"
+        self._groups[group].remove(v)
+
+    def in_group(self, group, v):
+        "True if v is in named group"
+        return group in self._groups and v in self._groups[group]
+
+    def group(self, group):
+        """The Set of vertices in a named group. 
+           Note: this is not a copy, it must not be changed by the caller.
+        """
+        if group not in self._groups:
+            self._groups[group] = Set()
+        return self._groups[group]
+
+    def clear_group(self, group):
+        "Remove all vertices from named group. Vertices remain in the graph."
+        self._groups[group] = Set()
+
+    def __str__(self):
+        s = "RelationGraph("
+        for relation in self._out:
+            s += str(relation)+":{"
+            for v in self._out[relation]:
+                s += str(v)+":"+str(self._out[relation][v].keys())+","
+            s += "},"
+        for group in self._groups:
+            s += str(group)+":"+str(list(self._groups[group]))+","
+        s += ")"
+        return s
+
+# end class RelationGraph
+
+
 def random_graph(vertices, edges, bidirectional = False, basename="v"):
     """generate a random graph with given number of
     vertices and edges"""
@@ -0,0 +1,454 @@
+"""Incremental pattern matching for cluster rewrite rules.
+
+An IncrementalMatcher keeps the matches of a number of rule patterns alive
+while clusters are added to and removed from a set of (top-level) clusters.
+It is a small Rete network:
+
+ - each rule pattern is split in cluster terms (slots), e.g.
+   ["rigid","$r",["$a","$b"]] is a slot named "$r"
+ - an alpha memory per slot holds all clusters that pass the type test
+   of the slot (point, distance, rigid, balloon or hedgehog)
+ - beta memories hold partial matches (tokens), i.e. tuples of clusters
+   bound to the first k slots, that pass the join tests
+ - complete tokens are kept in an agenda
+
+Adding a cluster only extends existing tokens with the new cluster, removing
+a cluster only retracts the tokens it is part of. Point variables are bound
+when a complete token is read from the agenda. The resulting matches are
+dictionaries mapping pattern vertices to clusters and point variables, like
+the solutions returned by gmatch.
+
+Patterns are given as pattern graphs, as created by pattern2graph in
+clsolver3D, and compiled once into a PatternMatcher. A PatternMatcher has a
+fixed join order (most constrained slots first) and generates candidates for
+a slot from the clusters adjacent to an already bound slot, so the cost of a
+join depends on the neighbourhood of a cluster, not on the number of clusters.
+PatternMatchers can also be used on their own, to match a single collection
+of clusters.
+"""
+
+from sets import Set
+from cluster import Rigid, Hedgehog, Balloon
+
+# ---------- pattern terms ----------
+
+_TYPES = ["point", "distance", "rigid", "balloon", "hedgehog"]
+
+# slots with a lower rank accept fewer clusters and are joined first
+_RANK = {"point":0, "distance":1, "hedgehog":2, "balloon":3, "rigid":4}
+
+class PatternSlot:
+    """A cluster term in a pattern.
+
+       instance attributes:
+        name   - the name of the cluster in the pattern, e.g. "$r"
+        type   - one of "point", "distance", "rigid", "balloon", "hedgehog"
+        vars   - list of pattern variables contained in the cluster
+        cvar   - the pattern variable that is the center of a hedgehog, or None
+    """
+
+    def __init__(self, name, type, vars, cvar=None):
+        self.name = name
+        self.type = type
+        self.vars = list(vars)
+        self.cvar = cvar
+
+    def accepts(self, cluster):
+        """True iff cluster passes the type test of this slot"""
+        if self.type == "rigid":
+            ok = isinstance(cluster, Rigid)
+        elif self.type == "point":
+            ok = isinstance(cluster, Rigid) and len(cluster.vars) == 1
+        elif self.type == "distance":
+            ok = isinstance(cluster, Rigid) and len(cluster.vars) == 2
+        elif self.type == "balloon":
+            ok = isinstance(cluster, Balloon)
+        elif self.type == "hedgehog":
+            ok = isinstance(cluster, Hedgehog)
+        else:
+            ok = False
+        return ok and len(cluster.vars) >= len(self.vars)
+
+    def __str__(self):
+        return "PatternSlot("+str(self.type)+","+str(self.name)+","+str(self.vars)+")"
+
+def pattern_slots(patterngraph):
+    """Returns the cluster terms (a list of PatternSlot) of a pattern graph.
+       Slots are sorted by name.
+    """
+    slots = []
+    for type in _TYPES:
+        if not patterngraph.has_vertex(type):
+            continue
+        for name in patterngraph.outgoing_vertices(type):
+            vars = []
+            cvar = None
+            for v in patterngraph.outgoing_vertices(name):
+                if str(v).startswith("cvar#"):
+                    cvar = patterngraph.outgoing_vertices(v)[0]
+                else:
+                    vars.append(v)
+            vars.sort()
+            slots.append(PatternSlot(name, type, vars, cvar))
+    slots.sort(lambda x,y: cmp(x.name, y.name))
+    return slots
+
+# ---------- compiled patterns ----------
+
+class PatternMatcher:
+    """A pattern, compiled for matching on clusters.
+
+       instance attributes:
+        slots   - list of PatternSlots, in join order
+        anchors - for each slot, the index of an earlier slot that shares point
+                  variables with it (candidates are found via the anchor), or None
+    """
+
+    def __init__(self, patterngraph):
+        self.slots = _join_order(pattern_slots(patterngraph))
+        n = len(self.slots)
+        # number of shared point variables required between slots
+        self._shared = {}
+        for i in range(n):
+            for j in range(n):
+                shared = Set(self.slots[i].vars).intersection(self.slots[j].vars)
+                self._shared[(i,j)] = len(shared)
+        self.anchors = []
+        for k in range(n):
+            anchor = None
+            for j in range(k):
+                if self._shared[(j,k)] > 0:
+                    if anchor == None or self._shared[(j,k)] > self._shared[(anchor,k)]:
+                        anchor = j
+            self.anchors.append(anchor)
+
+    def accepts(self, k, cluster):
+        """True iff cluster passes the type test of slot k"""
+        return self.slots[k].accepts(cluster)
+
+    def join(self, token, cluster):
+        """join test for binding cluster to the next slot of token"""
+        k = len(token)
+        slot = self.slots[k]
+        for j in range(k):
+            other = token[j]
+            if other is cluster:
+                return False
+            required = self._shared[(j,k)]
+            if required > 0:
+                shared = 0
+                for var in cluster.vars:
+                    if var in other.vars:
+                        shared += 1
+                if shared < required:
+                    return False
+            oslot = self.slots[j]
+            if slot.cvar != None and slot.cvar in oslot.vars:
+                if cluster.cvar not in other.vars:
+                    return False
+            if oslot.cvar != None and oslot.cvar in slot.vars:
+                if other.cvar not in cluster.vars:
+                    return False
+        return True
+
+    def candidates(self, token, neighbours):
+        """Returns clusters that may be bound to the next slot of token, i.e.
+           the neighbours of the cluster bound to the anchor of the slot, or None
+           if the slot has no anchor. Neighbours is a function that returns the
+           clusters sharing point variables with a given cluster (a collection).
+        """
+        anchor = self.anchors[len(token)]
+        if anchor == None:
+            return None
+        return neighbours(token[anchor])
+
+    def bindings(self, token):
+        """returns a list of matches for a complete token.
+           A match is a dictionary mapping pattern vertices to clusters and point variables.
+        """
+        return list(self.iter_bindings(token))
+
+    def iter_bindings(self, token):
+        """returns an iterator over the matches for a complete token"""
+        # candidate values for each pattern variable
+        candidates = {}
+        for i in range(len(self.slots)):
+            slot = self.slots[i]
+            cluster = token[i]
+            for var in slot.vars:
+                if var == slot.cvar:
+                    values = Set([cluster.cvar])
+                else:
+                    values = Set(cluster.vars)
+                if var in candidates:
+                    candidates[var] = candidates[var].intersection(values)
+                else:
+                    candidates[var] = values
+        patvars = candidates.keys()
+        patvars.sort(lambda x,y: cmp(len(candidates[x]), len(candidates[y])))
+        # depth first assignment of distinct point variables
+        base = {}
+        for i in range(len(self.slots)):
+            base[self.slots[i].name] = token[i]
+        return self._bind(patvars, 0, candidates, base, {})
+
+    def _bind(self, patvars, index, candidates, match, used):
+        if index == len(patvars):
+            yield dict(match)
+            return
+        patvar = patvars[index]
+        for value in candidates[patvar]:
+            if value in used:
+                continue
+            match[patvar] = value
+            used[value] = True
+            for m in self._bind(patvars, index+1, candidates, match, used):
+                yield m
+            del used[value]
+            del match[patvar]
+
+    def matches(self, nlet):
+        """Returns a list of matches of this pattern on a collection of clusters"""
+        return list(self.iter_matches(nlet))
+
+    def iter_matches(self, nlet):
+        """Returns an iterator over the matches of this pattern on a collection
+           of clusters. Matches are found depth-first, one at a time.
+        """
+        varclusters = {}
+        for cluster in nlet:
+            for var in cluster.vars:
+                if var not in varclusters:
+                    varclusters[var] = Set()
+                varclusters[var].add(cluster)
+        def neighbours(cluster):
+            result = {}
+            for var in cluster.vars:
+                for other in varclusters[var]:
+                    result[other] = True
+            return result
+        return self._extend((), nlet, neighbours)
+
+    def _extend(self, token, nlet, neighbours):
+        if len(token) == len(self.slots):
+            for m in self.iter_bindings(token):
+                yield m
+            return
+        candidates = self.candidates(token, neighbours)
+        if candidates == None:
+            candidates = nlet
+        for cluster in candidates:
+            if self.accepts(len(token), cluster) and self.join(token, cluster):
+                for m in self._extend(token + (cluster,), nlet, neighbours):
+                    yield m
+
+def _join_order(slots):
+    """order slots such that the most constrained slots come first and each
+       slot shares as many point variables as possible with earlier slots.
+    """
+    def key(slot, chosen):
+        shared = 0
+        for other in chosen:
+            shared += len(Set(slot.vars).intersection(other.vars))
+        return (-shared, _RANK[slot.type], -len(slot.vars), slot.name)
+    order = []
+    todo = list(slots)
+    while len(todo) > 0:
+        todo.sort(lambda x,y: cmp(key(x,order), key(y,order)))
+        order.append(todo.pop(0))
+    return order
+
+# ---------- rule network ----------
+
+class RuleNetwork:
+    """The alpha and beta memories for a single rule, joined by a PatternMatcher"""
+
+    def __init__(self, matcher, neighbours):
+        self.matcher = matcher
+        self._neighbours = neighbours
+        n = len(matcher.slots)
+        # memories are dictionaries used as sets, for speed
+        self.alpha = []
+        """per slot, the clusters that passed the type test"""
+        for i in range(n):
+            self.alpha.append({})
+        self.beta = []
+        """per number of bound slots, the tokens"""
+        for i in range(n+1):
+            self.beta.append({})
+        self.beta[0][()] = True
+        self._tokens = {}
+        """map from clusters to the tokens that contain it"""
+
+    def agenda(self):
+        """the list of complete tokens"""
+        return self.beta[len(self.matcher.slots)].keys()
+
+    def add(self, cluster):
+        """add a cluster and extend tokens"""
+        accepted = []
+        for k in range(len(self.matcher.slots)):
+            if self.matcher.accepts(k, cluster):
+                self.alpha[k][cluster] = True
+                accepted.append(k)
+        # right activation of join nodes that accept the new cluster
+        for k in accepted:
+            for token in self._right_candidates(k, cluster):
+                if cluster not in token and self.matcher.join(token, cluster):
+                    self._activate(token + (cluster,))
+
+    def _right_candidates(self, k, cluster):
+        """tokens with k bound slots that may be joined with cluster"""
+        anchor = self.matcher.anchors[k]
+        if anchor == None:
+            return self.beta[k].keys()
+        tokens = []
+        for other in self._neighbours(cluster):
+            if other is cluster or other not in self._tokens:
+                continue
+            for token in self._tokens[other]:
+                if len(token) == k and token[anchor] is other:
+                    tokens.append(token)
+        return tokens
+
+    def remove(self, cluster):
+        """remove a cluster and retract tokens"""
+        for alpha in self.alpha:
+            if cluster in alpha:
+                del alpha[cluster]
+        if cluster in self._tokens:
+            for token in self._tokens[cluster]:
+                del self.beta[len(token)][token]
+                for other in token:
+                    if other is not cluster:
+                        del self._tokens[other][token]
+            del self._tokens[cluster]
+
+    def _activate(self, token):
+        """store token and left-activate the next join node"""
+        k = len(token)
+        if token in self.beta[k]:
+            return
+        self.beta[k][token] = True
+        for cluster in token:
+            if cluster not in self._tokens:
+                self._tokens[cluster] = {}
+            self._tokens[cluster][token] = True
+        if k < len(self.matcher.slots):
+            candidates = self.matcher.candidates(token, self._neighbours)
+            if candidates == None:
+                candidates = self.alpha[k]
+            else:
+                alpha = self.alpha[k]
+                candidates = filter(lambda c: c in alpha, candidates)
+            for cluster in candidates:
+                if cluster not in token and self.matcher.join(token, cluster):
+                    self._activate(token + (cluster,))
+
+# ---------- matcher ----------
+
+class IncrementalMatcher:
+    """Keeps the matches of a number of rules up to date for a changing set of clusters.
+
+       Rules are identified by a key (e.g. a method class) and have a PatternMatcher.
+    """
+
+    def __init__(self):
+        self._rules = {}
+        """map from rule keys to RuleNetworks"""
+        self._clusters = Set()
+        """the set of clusters currently in the matcher"""
+        self._varclusters = {}
+        """map from point variables to the clusters that contain them"""
+
+    def add_rule(self, key, matcher):
+        """Add a rule, with a PatternMatcher"""
+        network = RuleNetwork(matcher, self._neighbours)
+        self._rules[key] = network
+        for cluster in self._clusters:
+            network.add(cluster)
+
+    def add(self, cluster):
+        """Add a cluster. Extends partial matches of all rules."""
+        if cluster in self._clusters:
+            return
+        self._clusters.add(cluster)
+        for var in cluster.vars:
+            if var not in self._varclusters:
+                self._varclusters[var] = Set()
+            self._varclusters[var].add(cluster)
+        for network in self._rules.values():
+            network.add(cluster)
+
+    def remove(self, cluster):
+        """Remove a cluster. Retracts partial matches of all rules."""
+        if cluster not in self._clusters:
+            return
+        self._clusters.remove(cluster)
+        for var in cluster.vars:
+            self._varclusters[var].discard(cluster)
+            if len(self._varclusters[var]) == 0:
+                del self._varclusters[var]
+        for network in self._rules.values():
+            network.remove(cluster)
+
+    def _neighbours(self, cluster):
+        """the clusters that share a point variable with given cluster"""
+        result = {}
+        for var in cluster.vars:
+            if var in self._varclusters:
+                for other in self._varclusters[var]:
+                    result[other] = True
+        return result
+
+    def clusters(self):
+        """returns a list of clusters in the matcher"""
+        return list(self._clusters)
+
+    def matches(self, key, nlet=None):
+        """Returns a list of matches of the given rule.
+           If a collection of clusters (nlet) is given, then only matches
+           on clusters in the nlet are returned.
+        """
+        return list(self.iter_matches(key, nlet))
+
+    def iter_matches(self, key, nlet=None):
+        """Returns an iterator over the matches of the given rule (see matches)"""
+        network = self._rules[key]
+        if nlet == None:
+            tokens = network.agenda()
+        else:
+            nlet = Set(nlet)
+            tokens = filter(lambda t: Set(t).issubset(nlet), network.agenda())
+        for token in tokens:
+            for m in network.matcher.iter_bindings(token):
+                yield m
+
+    def __str__(self):
+        s = "IncrementalMatcher("
+        s += str(len(self._clusters))+" clusters, "
+        for key in self._rules:
+            s += str(key) + ":" + str(len(self._rules[key].agenda())) + " "
+        s += ")"
+        return s
+
+def test():
+    from clsolver3D import MergeDDD, MergeRR
+    a = Rigid(['a','b'])
+    b = Rigid(['a','c'])
+    c = Rigid(['b','c'])
+    d = Rigid(['a','b','c','d'])
+    matcher = IncrementalMatcher()
+    matcher.add_rule("DDD", MergeDDD.patternmatcher)
+    matcher.add_rule("RR", MergeRR.patternmatcher)
+    for cluster in [a,b,c,d]:
+        matcher.add(cluster)
+    print matcher
+    print "DDD matches:", len(matcher.matches("DDD"))
+    print "DDD matches in a,b,c:", len(matcher.matches("DDD", [a,b,c]))
+    print "compiled DDD matches in a,b,c:", len(MergeDDD.patternmatcher.matches([a,b,c]))
+    matcher.remove(b)
+    print "after removing", b
+    print "DDD matches:", len(matcher.matches("DDD"))
+
+if __name__ == "__main__": test()
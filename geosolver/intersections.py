@@ -4,6 +4,12 @@ from matfunc import Mat,Vec
 from tolerance import *
 from diagnostic import *
 
+# numpy is optional
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # ------ misc fucntions ----------
 
 def sign(x):
@@ -26,8 +32,8 @@ def sss_int(p1, r1, p2, r2, p3, r3):
     n = vector.cross(p2-p1, p3-p1)
     n = n / vector.norm(n)
     # intersect circles in plane
-    cp1 = vector.vector([0.0,0.0]) 
-    cp2 = vector.vector([vector.norm(p2-p1), 0.0])
+    cp1 = vector.fastvector([0.0,0.0]) 
+    cp2 = vector.fastvector([vector.norm(p2-p1), 0.0])
     cpxs = cc_int(cp1, r1, cp2, r2)
     if len(cpxs) == 0:
         return []
@@ -41,12 +47,12 @@ def sss_int(p1, r1, p2, r2, p3, r3):
     # py = project p3 on px,nx
     dy3 = vector.dot(p3-px, nx)
     py = p3 - (nx * dy3)
-    if tol_gt(dy3, r3):
+    if tol_gt(abs(dy3), r3):
         return []
-    ry = math.sin(math.acos(abs(dy3/r3)))*r3
+    ry = math.sin(math.acos(min(1.0, abs(dy3/r3))))*r3
     # print "py,ry:",py,ry
-    cpx = vector.vector([0.0,0.0]) 
-    cpy = vector.vector([vector.norm(py-px), 0.0])
+    cpx = vector.fastvector([0.0,0.0]) 
+    cpy = vector.fastvector([vector.norm(py-px), 0.0])
     cp4s = cc_int(cpx, rx, cpy, ry)
     for cp4 in cp4s:
         p4 = px + (py-px) * cp4[0] / vector.norm(py-px) + n * cp4[1] 
@@ -73,18 +79,18 @@ def cc_int(p1, r1, p2, r2):
             v = math.sqrt(r1*r1 - u*u)
 	s = (p2-p1) * u / d
 	if tol_eq(vector.norm(s),0):
-	        p3a = p1+vector.vector([p2[1]-p1[1],p1[0]-p2[0]])*r1/d
+	        p3a = p1+vector.fastvector([p2[1]-p1[1],p1[0]-p2[0]])*r1/d
 	        if tol_eq(r1/d,0):
                     return [p3a]
                 else:
-                    p3b = p1+vector.vector([p1[1]-p2[1],p2[0]-p1[0]])*r1/d
+                    p3b = p1+vector.fastvector([p1[1]-p2[1],p2[0]-p1[0]])*r1/d
                     return [p3a,p3b]
 	else:
-	        p3a = p1 + s + vector.vector([s[1], -s[0]]) * v / vector.norm(s) 
+	        p3a = p1 + s + vector.fastvector([s[1], -s[0]]) * v / vector.norm(s) 
                 if tol_eq(v / vector.norm(s),0):
                     return [p3a]
                 else:
-                    p3b = p1 + s + vector.vector([-s[1], s[0]]) * v / vector.norm(s)
+                    p3b = p1 + s + vector.fastvector([-s[1], s[0]]) * v / vector.norm(s)
     	            return [p3a,p3b]
 
 
@@ -104,12 +110,12 @@ def cl_int(p1,r,p2,v):
 		x2 = p1[0] + (D * v[1] - sign(v[1])*v[0]*sE) / d2
 		y1 = p1[1] + (-D * v[0] + abs(v[1])*sE) / d2
 		y2 = p1[1] + (-D * v[0] - abs(v[1])*sE) / d2
-		return [vector.vector([x1,y1]), vector.vector([x2,y2])]
+		return [vector.fastvector([x1,y1]), vector.fastvector([x2,y2])]
 	elif tol_eq(E, 0):
 		x1 = p1[0] + D * v[1] / d2
 		y1 = p1[1] + -D * v[0] / d2
-		# return [vector.vector([x1,y1]), vector.vector([x1,y1])]
-		return [vector.vector([x1,y1])]
+		# return [vector.fastvector([x1,y1]), vector.fastvector([x1,y1])]
+		return [vector.fastvector([x1,y1])]
 	else:
 		return []
 
@@ -165,6 +171,172 @@ def rr_int(p1, v1, p2, v2):
 	else:
 		return []
 
+# -------- vectorized intersections -------
+#
+# The following functions intersect N pairs (or triples) of objects at once. 
+# Arguments are sequences of N points or vectors, or numpy arrays of shape (N, d). 
+# Radii may be sequences of N values or a single value. 
+# Each function returns a tuple (points, counts), where counts[i] is the 
+# number of solutions for the i-th input, and points[i][j], for j < counts[i], 
+# are the solutions, in the same order as returned by the scalar function.
+# With numpy, points is an array of shape (N, maxcount, d), padded with nan, 
+# and counts is an integer array. Without numpy, the scalar functions are 
+# called for each input and points is a list of lists of vectors.
+
+def cc_int_all(p1, r1, p2, r2):
+    """Intersect circles (p1,r1) with circles (p2,r2), see cc_int"""
+    if not numpy:
+        return _scalar_all(cc_int, p1, r1, p2, r2)
+    (p1, p2) = (_points(p1), _points(p2))
+    n = len(p1)
+    (r1, r2) = (_values(r1, n), _values(r2, n))
+    dv = p2 - p1
+    d = _norms(dv)
+    ok = d > default_tol
+    d = numpy.where(ok, d, 1.0)
+    u = ((r1*r1 - r2*r2)/d + d)/2
+    ok &= ~(u*u - r1*r1 > default_tol)
+    v = numpy.sqrt(numpy.maximum(r1*r1 - u*u, 0.0))
+    s = dv * (u/d)[:,numpy.newaxis]
+    sn = _norms(s)
+    centered = sn <= default_tol
+    sn = numpy.where(centered, 1.0, sn)
+    # solutions are base + offset and base - offset 
+    base = numpy.where(centered[:,numpy.newaxis], p1, p1 + s)
+    offset = numpy.where(centered[:,numpy.newaxis], 
+        numpy.array([dv[:,1], -dv[:,0]]).T * (r1/d)[:,numpy.newaxis],
+        numpy.array([s[:,1], -s[:,0]]).T * (v/sn)[:,numpy.newaxis])
+    single = numpy.where(centered, r1/d, v/sn) <= default_tol
+    counts = numpy.where(ok, numpy.where(single, 1, 2), 0)
+    return (_solutions([base + offset, base - offset], counts), counts)
+
+def cl_int_all(p1, r, p2, v):
+    """Intersect circles (p1,r) with lines (p2,v), see cl_int. 
+       A line with direction (0,0) has no solutions (cl_int divides by zero)."""
+    if not numpy:
+        return _scalar_all(cl_int, p1, r, p2, v)
+    (p1, p2, v) = (_points(p1), _points(p2), _points(v))
+    n = len(p1)
+    r = _values(r, n)
+    p = p2 - p1
+    d2 = v[:,0]*v[:,0] + v[:,1]*v[:,1]
+    D = p[:,0]*v[:,1] - v[:,0]*p[:,1]
+    E = r*r*d2 - D*D
+    two = (d2 > default_tol) & (E > default_tol)
+    one = ~two & (numpy.abs(E) <= default_tol) & (d2 != 0.0)
+    d2 = numpy.where(d2 != 0.0, d2, 1.0)
+    sE = numpy.sqrt(numpy.where(two, E, 0.0))
+    sign = numpy.where(v[:,1] > 0, 1.0, -1.0)
+    x = p1[:,0] + D * v[:,1] / d2
+    y = p1[:,1] - D * v[:,0] / d2
+    dx = sign * v[:,0] * sE / d2
+    dy = numpy.abs(v[:,1]) * sE / d2
+    a = numpy.array([x + dx, y + dy]).T
+    b = numpy.array([x - dx, y - dy]).T
+    counts = numpy.where(two, 2, numpy.where(one, 1, 0))
+    return (_solutions([a, b], counts), counts)
+
+def ll_int_all(p1, v1, p2, v2):
+    """Intersect lines though p1 with direction v1 with lines through p2 with direction v2,
+       see ll_int"""
+    if not numpy:
+        return _scalar_all(ll_int, p1, v1, p2, v2)
+    (p1, v1, p2, v2) = (_points(p1), _points(v1), _points(p2), _points(v2))
+    det = v1[:,0]*v2[:,1] - v1[:,1]*v2[:,0]
+    ok = numpy.abs(det) > default_tol
+    d = p2 - p1
+    general = numpy.abs(v2[:,1]) > default_tol
+    # in the general case, t1 = (d[0] + d[1]*r2) / f = (d[0]*v2[1] - d[1]*v2[0]) / det
+    det = numpy.where(ok, det, 1.0)
+    vertical = numpy.where(v1[:,1] != 0.0, v1[:,1], 1.0)
+    t1 = numpy.where(general, (d[:,0]*v2[:,1] - d[:,1]*v2[:,0]) / det, d[:,1] / vertical)
+    counts = numpy.where(ok, 1, 0)
+    return (_solutions([p1 + v1 * t1[:,numpy.newaxis]], counts), counts)
+
+def sss_int_all(p1, r1, p2, r2, p3, r3):
+    """Intersect spheres centered in p1, p2, p3 with radius r1, r2, r3, see sss_int.
+       If p1, p2 and p3 are collinear, there are no solutions (sss_int divides by zero)."""
+    if not numpy:
+        return _scalar_all(sss_int, p1, r1, p2, r2, p3, r3)
+    (p1, p2, p3) = (_points(p1), _points(p2), _points(p3))
+    m = len(p1)
+    (r1, r2, r3) = (_values(r1, m), _values(r2, m), _values(r3, m))
+    zeros = numpy.zeros(m)
+    # plane though p1, p2, p3
+    n = numpy.cross(p2-p1, p3-p1)
+    nn = _norms(n)
+    ok = nn != 0.0
+    n = n / numpy.where(ok, nn, 1.0)[:,numpy.newaxis]
+    # intersect circles in plane
+    d12 = _norms(p2-p1)
+    ok &= d12 != 0.0
+    d12 = numpy.where(ok, d12, 1.0)
+    (cpxs, cpxcounts) = cc_int_all(numpy.array([zeros, zeros]).T, r1, numpy.array([d12, zeros]).T, r2)
+    ok &= cpxcounts > 0
+    cpx = numpy.where(ok[:,numpy.newaxis], cpxs[:,0], 0.0)
+    # px, rx, nx is circle 
+    nx = (p2-p1) / d12[:,numpy.newaxis]
+    px = p1 + nx * cpx[:,0][:,numpy.newaxis]
+    rx = numpy.abs(cpx[:,1])
+    # py = project p3 on px,nx
+    dy3 = (_dots(p3-px, nx))
+    py = p3 - nx * dy3[:,numpy.newaxis]
+    ok &= ~(numpy.abs(dy3) - r3 > default_tol)
+    ok &= r3 != 0.0
+    r3 = numpy.where(ok, r3, 1.0)
+    ry = numpy.sin(numpy.arccos(numpy.minimum(1.0, numpy.abs(dy3/r3))))*r3
+    dxy = _norms(py-px)
+    (cp4s, counts) = cc_int_all(numpy.array([zeros, zeros]).T, rx, numpy.array([dxy, zeros]).T, ry)
+    counts = numpy.where(ok, counts, 0)
+    dxy = numpy.where(dxy != 0.0, dxy, 1.0)[:,numpy.newaxis]
+    solutions = []
+    for j in range(2):
+        cp4 = cp4s[:,j]
+        solutions.append(px + (py-px) * cp4[:,0][:,numpy.newaxis] / dxy + n * cp4[:,1][:,numpy.newaxis])
+    return (_solutions(solutions, counts), counts)
+
+def _points(points):
+    """an N x d array of points"""
+    return numpy.array(map(list, points), dtype=float).reshape(len(points), -1)
+
+def _values(values, n):
+    """an array of N values (from a sequence or a single value)"""
+    return numpy.broadcast_to(numpy.asarray(values, dtype=float), (n,))
+
+def _norms(a):
+    return numpy.sqrt((a*a).sum(axis=1))
+
+def _dots(a, b):
+    return (a*b).sum(axis=1)
+
+def _solutions(candidates, counts):
+    """an N x len(candidates) x d array of the first counts[i] candidates of each row,
+       padded with nan"""
+    points = numpy.array(candidates).swapaxes(0,1)
+    mask = numpy.arange(len(candidates))[numpy.newaxis,:] >= counts[:,numpy.newaxis]
+    points[mask] = numpy.nan
+    return points
+
+def _scalar_all(function, *args):
+    """call an intersection function for each row of arguments, without numpy.
+       Degenerate inputs for which the function divides by zero have no solutions."""
+    n = len(args[0])
+    points = []
+    for i in range(n):
+        row = []
+        for arg in args:
+            if isinstance(arg, (int, float)):
+                row.append(arg)
+            elif isinstance(arg[i], (int, float)):
+                row.append(arg[i])
+            else:
+                row.append(vector.vector(list(arg[i])))
+        try:
+            points.append(function(*row))
+        except ZeroDivisionError:
+            points.append([])
+    return (points, map(len, points))
+
 # ----- Geometric properties ------- 
 
 def angle_3p(p1, p2, p3):
@@ -457,6 +629,31 @@ def test_sss_int():
         # print sat
     return sat
 
+def test_int_all():
+    """compare vectorized and scalar intersections of random inputs. returns True iff succesful"""
+    n = 100
+    p = map(lambda i: vector.randvec(3, 0.0, 10.0), range(4*n))
+    (p1, p2, p3, p4) = (p[0:n], p[n:2*n], p[2*n:3*n], p[3*n:])
+    r1 = map(lambda i: vector.norm(p4[i]-p1[i]), range(n))
+    r2 = map(lambda i: vector.norm(p4[i]-p2[i]), range(n))
+    r3 = map(lambda i: vector.norm(p4[i]-p3[i]), range(n))
+    sat = True
+    (points, counts) = sss_int_all(p1, r1, p2, r2, p3, r3)
+    for i in range(n):
+        sols = sss_int(p1[i], r1[i], p2[i], r2[i], p3[i], r3[i])
+        sat = sat and counts[i] == len(sols)
+        for j in range(len(sols)):
+            sat = sat and tol_eq(vector.norm(sols[j] - vector.vector(list(points[i][j]))), 0.0)
+    q1 = map(lambda x: vector.vector(x[0:2]), p1)
+    q2 = map(lambda x: vector.vector(x[0:2]), p2)
+    (points, counts) = cc_int_all(q1, r1, q2, r2)
+    for i in range(n):
+        sols = cc_int(q1[i], r1[i], q2[i], r2[i])
+        sat = sat and counts[i] == len(sols)
+        for j in range(len(sols)):
+            sat = sat and tol_eq(vector.norm(sols[j] - vector.vector(list(points[i][j]))), 0.0)
+    return sat
+
 def test1():
 	#diag_select(".*")
 	sat = True
@@ -506,6 +703,11 @@ def test1():
 	else:
 		print "sss_int() failed"
 
+	if test_int_all():
+		print "vectorized intersections passed"
+	else:
+		print "vectorized intersections failed"
+
 	print "2D angles" 
 	for i in xrange(9):
 		a = i * 45 * math.pi / 180
@@ -12,6 +12,7 @@ Changes:
 23 Nov 2004 - added Error classes, updated naming and doc conventions (PEP 8, 257)
 """
 
+import heapq
 from graph import Graph
 
 # ----------- misc stuff -----------
@@ -123,6 +124,24 @@ class MethodGraph:
         """A graph for fast navigation"""
         self._changed = {}
         """Set of changed variables since last propagation"""
+        self._order = {}
+        """A map from variables and methods to their position in a topological order"""
+        self._next = 0
+        """The next free position in the topological order"""
+        self._stats = {"waves":0, "executions":0, "saved":0}
+        """Propagation counters"""
+        self._dirty = {}
+        """Set of methods to be executed at next propagation"""
+        self._batch = 0
+        """Nesting depth of batches. Propagation is deferred while in a batch"""
+        self._budget = None
+        """A Budget checked before each method execution, or None"""
+        self._interrupted = None
+        """The reason the last propagation was stopped, or None"""
+        self._lazy = False
+        """If True, methods are executed on demand (see set_lazy)"""
+        self._stale = {}
+        """Set of methods with out-of-date outputs, to be executed on demand"""
 
     def variables(self):
         """return a list of variables"""
@@ -137,6 +156,8 @@ class MethodGraph:
         if not varname in self._map:
             self._map[varname] = value
             self._graph.add_vertex(varname)
+            self._order[varname] = self._next
+            self._next += 1
     
     def rem_variable(self, varname):
         """Remove a variable and all methods on that variable"""
@@ -151,14 +172,24 @@ class MethodGraph:
                 self.rem_method(met)
             # remove it from graph
             self._graph.rem_vertex(varname)
+            del self._order[varname]
         else:
             raise StandardError, "variable not in graph"
     # end rem variable
 
     def get(self,varname):
-        """get the value of a variable"""
+        """get the value of a variable. Out-of-date values are computed first (see set_lazy)."""
+        if len(self._stale) > 0:
+            self._update(varname)
         return self._map[varname]
 
+    def determining_method(self, varname):
+        """return the method that determines the value of a variable, or None"""
+        methods = self._graph.ingoing_vertices(varname)
+        if len(methods) == 0:
+            return None
+        return methods[0]
+
     def set(self, varname, value, prop = True):
         """Set the value of a variable.
         
@@ -180,33 +211,43 @@ class MethodGraph:
         if met in self._methods:
             return 
         self._methods[met] = 1
-        # update graph    
+        # update graph; the inputs are added first, so they precede the method in the order
         for var in met.inputs():
             self.add_variable(var)
+        self._order[met] = self._next
+        self._next += 1
+        for var in met.inputs():
             self._graph.add_edge(var, met)
         for var in met.outputs():
             self.add_variable(var)
             self._graph.add_edge(met, var)
         
         # check validity of graph
+        # note: input edges cannot break the topological order, because 
+        # the method is last in the order.
         for var in met.outputs():
             if len(self._graph.ingoing_vertices(var)) > 1: 
                 self.rem_method(met)
                 raise ValidityError, "variable "+str(var)+" determined by multiple methods"
-            elif len(self._graph.path(var, var)) != 0:
+            elif not self._update_order(met, var):
                 self.rem_method(met)
                 raise ValidityError, "cylce in graph not allowed (variable "+str(var)+")"
         # end for    
         
         if prop:
-            self._execute(met)
+            self._dirty[met] = 1
             self.propagate()
         
     def rem_method(self, met):
         """Remove a method"""
         if met in self._methods:
             del self._methods[met]
+            if met in self._dirty:
+                del self._dirty[met]
+            if met in self._stale:
+                del self._stale[met]
             self._graph.rem_vertex(met)
+            del self._order[met]
         else:
             raise StandardError, "method not in graph"
 
@@ -218,17 +259,208 @@ class MethodGraph:
         from set() and add_method() by default. However, if the
         user so chooses, the methods will not call propagate, and
         the user should call this fucntion at a convenient time. 
+
+        Methods are executed in topological order, so a method
+        is executed at most once per propagation, even if several
+        of its inputs have changed.
+
+        Within a batch (see begin_batch), propagation is deferred until
+        the end of the batch. In lazy mode (see set_lazy), methods are not 
+        executed, but only marked out of date. If the budget is exhausted (see set_budget), 
+        propagation stops and the methods that were not executed yet remain 
+        scheduled for the next propagation.
         """
-        while len(self._changed) != 0:
-            pick = self._changed.keys()[0]
-            methods = self._graph.outgoing_vertices(pick)
-            for met in methods:
+        if self._batch > 0:
+            return
+        if len(self._changed) == 0 and len(self._dirty) == 0:
+            self._interrupted = None
+            return
+        if self._lazy:
+            self._mark_stale()
+            return
+        self._stats["waves"] += 1
+        rank = self._order
+        queue = []          # heap of (rank, count, method)
+        scheduled = {}      # set of methods in queue
+        count = 0
+        # schedule new methods
+        for met in self._dirty:
+            scheduled[met] = True
+            heapq.heappush(queue, (rank[met], count, met))
+            count += 1
+        self._dirty = {}
+        while len(self._changed) != 0 or len(queue) != 0:
+            # schedule methods on changed variables
+            for var in self._changed.keys():
+                for met in self._graph.outgoing_vertices(var):
+                    if met in scheduled:
+                        self._stats["saved"] += 1
+                    else:
+                        scheduled[met] = True
+                        heapq.heappush(queue, (rank[met], count, met))
+                        count += 1
+            self._changed = {}
+            # stop if the budget is exhausted
+            if len(queue) != 0 and self._budget != None:
+                self._interrupted = self._budget.exhausted()
+                if self._interrupted != None:
+                    for (r, c, met) in queue:
+                        self._dirty[met] = 1
+                    return
+            # execute the method with lowest rank
+            if len(queue) != 0:
+                (r, c, met) = heapq.heappop(queue)
+                del scheduled[met]
                 self._execute(met)
-            #end for
-            if pick in self._changed:
-                del self._changed[pick]
         #end while
+        self._interrupted = None
     #end def propagate
+
+    def set_lazy(self, lazy):
+        """If lazy is True, propagation does not execute methods, but marks them and
+           all methods that depend on them as out of date. The values of their output 
+           variables are computed when requested (see get), by executing only the 
+           out-of-date methods they depend on. If lazy is False, all out-of-date 
+           methods are executed now.
+        """
+        self._lazy = lazy
+        if not lazy:
+            for met in self._stale:
+                self._dirty[met] = 1
+            self._stale = {}
+            self.propagate()
+
+    def is_lazy(self):
+        """True iff methods are executed on demand (see set_lazy)"""
+        return self._lazy
+
+    def _mark_stale(self):
+        """mark scheduled methods, methods on changed variables and all
+           methods that depend on them as out of date"""
+        front = self._dirty.keys()
+        for var in self._changed:
+            front.extend(self._graph.outgoing_vertices(var))
+        self._dirty = {}
+        self._changed = {}
+        while len(front) > 0:
+            met = front.pop()
+            if met in self._stale:
+                # methods that depend on it are already out of date
+                continue
+            self._stale[met] = 1
+            for var in met.outputs():
+                front.extend(self._graph.outgoing_vertices(var))
+
+    def _update(self, varname):
+        """execute the out-of-date methods that a variable depends on, in topological order"""
+        methods = []
+        visited = {}
+        front = [varname]
+        while len(front) > 0:
+            var = front.pop()
+            for met in self._graph.ingoing_vertices(var):
+                if met in self._stale and met not in visited:
+                    visited[met] = True
+                    methods.append(met)
+                    front.extend(met.inputs())
+        if len(methods) == 0:
+            return
+        methods.sort(lambda x,y: cmp(self._order[x], self._order[y]))
+        # methods that depend on the outputs are already out of date, so the 
+        # change flags are restored afterwards
+        changed = self._changed
+        self._changed = {}
+        for met in methods:
+            if met in self._stale:
+                del self._stale[met]
+                self._execute(met)
+        self._changed = changed
+
+    def set_budget(self, budget):
+        """Set a Budget (see budget.py) that is checked before each method
+           execution, or None for no limits. Call propagate to resume an
+           interrupted propagation."""
+        self._budget = budget
+
+    def interrupted(self):
+        """Returns the reason the last propagation was stopped (see Budget.exhausted),
+           or None if it was completed"""
+        return self._interrupted
+
+    def begin_batch(self):
+        """Start a batch of changes. Propagation is deferred until the
+           matching call to end_batch. Batches may be nested.
+        """
+        self._batch += 1
+
+    def end_batch(self):
+        """End a batch of changes and propagate all changes at once."""
+        if self._batch == 0:
+            raise StandardError, "end_batch without begin_batch"
+        self._batch -= 1
+        self.propagate()
+
+    def propagation_stats(self):
+        """Returns a dictionary with propagation counters:
+            waves      - number of propagations with pending changes
+            executions - number of method executions
+            saved      - number of executions saved by executing methods
+                         at most once per propagation
+        """
+        return dict(self._stats)
+
+    def order(self):
+        """Returns a list of variables and methods in topological order"""
+        l = self._order.keys()
+        l.sort(lambda x,y: cmp(self._order[x], self._order[y]))
+        return l
+
+    def _update_order(self, x, y):
+        """Update the topological order for a new edge (x,y), using the
+           algorithm of Pearce and Kelly. Only the vertices between x and
+           y in the order are visited. Returns False iff the edge closes 
+           a cycle (the order is not changed in that case).
+        """
+        lb = self._order[y]
+        ub = self._order[x]
+        if lb > ub:
+            return True
+        # forward search from y, for vertices ordered before x 
+        forward = []
+        visited = {y:True}
+        front = [y]
+        while len(front) > 0:
+            v = front.pop()
+            forward.append(v)
+            for w in self._graph.outgoing_vertices(v):
+                if self._order[w] == ub:
+                    # w is x
+                    return False
+                if w not in visited and self._order[w] < ub:
+                    visited[w] = True
+                    front.append(w)
+        # backward search from x, for vertices ordered after y
+        backward = []
+        visited = {x:True}
+        front = [x]
+        while len(front) > 0:
+            v = front.pop()
+            backward.append(v)
+            for u in self._graph.ingoing_vertices(v):
+                if u not in visited and self._order[u] > lb:
+                    visited[u] = True
+                    front.append(u)
+        # reassign the positions of the visited vertices:
+        # first the backward set, then the forward set
+        bycmp = lambda a,b: cmp(self._order[a], self._order[b])
+        forward.sort(bycmp)
+        backward.sort(bycmp)
+        vertices = backward + forward
+        positions = map(lambda v: self._order[v], vertices)
+        positions.sort()
+        for i in range(len(vertices)):
+            self._order[vertices[i]] = positions[i]
+        return True
     
     def clear(self):
         """clear methodgraph by removing all variables"""
@@ -246,6 +478,14 @@ class MethodGraph:
         else:
             raise StandardError, "method not in graph"
 
+    def schedule(self, met):
+        """Schedule a method for execution in the next propagation, 
+           even if none of its inputs have changed. Method must be in Methodgraph"""
+        if met in self._methods:
+            self._dirty[met] = 1
+        else:
+            raise StandardError, "method not in graph"
+
     def _execute(self, met):
         """Execute a method. 
         Method is executed only if all inputvariable values are not None
@@ -266,12 +506,14 @@ class MethodGraph:
             outmap = {}
         else:
             outmap = met.execute(inmap)
+            self._stats["executions"] += 1
         # update values in self._map
-        # set output variables changed
+        # set output variables changed (unless the method returned the current value)
         for var in met.outputs():
             if var in outmap:
-                self._map[var] = outmap[var]
-                self._changed[var] = 1
+                if outmap[var] is not self._map[var]:
+                    self._map[var] = outmap[var]
+                    self._changed[var] = 1
             else:
                 if self._map[var] != None:
                     self._changed[var] = 1
@@ -436,6 +678,26 @@ def test():
         print "success: should not be possible"
     except Exception, e:
         print e 
+    print "x := x + k"
+    try:
+        MethodGraph().add_method(AddMethod('x','k','x'))
+        print "success: should not be possible"
+    except Exception, e:
+        print e 
+    print "f := c + d, g := d + f"
+    mg.add_method(AddMethod('c','d','f'))
+    mg.add_method(AddMethod('d','f','g'))
+    print "set a = 1"
+    mg.set('a', 1)
+    print "g = "+str(mg.get('g'))
+    print "propagation stats:", mg.propagation_stats()
+    print "topological order:", _strseq(mg.order())
+    print "lazy: set a = 2"
+    mg.set_lazy(True)
+    mg.set('a', 2)
+    executions = mg.propagation_stats()["executions"]
+    print "d = "+str(mg.get('d')), mg.propagation_stats()["executions"] - executions, "executions"
+    print "g = "+str(mg.get('g')), mg.propagation_stats()["executions"] - executions, "executions"
 
 if __name__ == "__main__": 
     test()
@@ -1,7 +1,7 @@
 """Base classes for multi-valued assignments in methodgraphs"""
 
 from method import Method, MethodGraph
-from sets import Set
+import heapq
 
 class MultiVariable:
     """For representing multi-valued variables
@@ -18,6 +18,70 @@ class MultiVariable:
         else:
             return "MultiVariable("+self.name+")"
 
+class ValueSet:
+    """A set of values, e.g. the values of a MultiVariable.
+
+       Values that define a canonical_keys method (e.g. Configurations) are stored in
+       buckets. The first key returned by canonical_keys is the bucket for the value, 
+       the other keys are neighbouring buckets that may contain equal values. 
+       A new value is only compared with values in those buckets, so values that 
+       are equal within some tolerance can be found without hashing them. 
+       Other values are hashed as usual. 
+    """
+
+    def __init__(self, values=[]):
+        self._buckets = {}
+        """map from keys to lists of values"""
+        self._values = []
+        self.union_update(values)
+
+    def add(self, value):
+        """Add a value, unless an equal value is in the set. Returns True iff the value was added"""
+        if hasattr(value, "canonical_keys"):
+            keys = value.canonical_keys()
+        else:
+            keys = [value]
+        for key in keys:
+            if key in self._buckets:
+                for other in self._buckets[key]:
+                    if other == value:
+                        return False
+        if keys[0] in self._buckets:
+            self._buckets[keys[0]].append(value)
+        else:
+            self._buckets[keys[0]] = [value]
+        self._values.append(value)
+        return True
+
+    def union_update(self, values):
+        """Add all given values"""
+        for value in values:
+            self.add(value)
+
+    def __contains__(self, value):
+        if hasattr(value, "canonical_keys"):
+            keys = value.canonical_keys()
+        else:
+            keys = [value]
+        for key in keys:
+            if key in self._buckets:
+                for other in self._buckets[key]:
+                    if other == value:
+                        return True
+        return False
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return str(self)
+
+    def __str__(self):
+        return "ValueSet("+str(self._values)+")"
+
 class MultiMethod(Method):
     """A Method that is executed for multiple alternative inputs, resulting
        in multiple output values. 
@@ -32,9 +96,30 @@ class MultiMethod(Method):
        shadowed counterpart in the input map for multi_execute.
 
        The 'multi_execute' method must return a list of possible values for the output variable.
-       The output values returned by subsequent calls multi-execute are collected and stored in the 
-       output MultiVariable. 
+       The output values returned by subsequent calls multi-execute are collected in a ValueSet 
+       (without duplicates, see collect) and stored in the output MultiVariable. 
+
+       Output values can be selected with filters (see add_filter), and the number of 
+       output values can be limited to the best ones (see set_beam) or to the first 
+       ones (see set_limit). Permutations are
+       generated one at a time and filters are applied as soon as an output value is
+       generated, so rejected values are never collected or passed on. 
+
+       Subclasses may also implement 'batch_execute', which computes the output values 
+       for all permutations at once (e.g. vectorized). If it returns None, multi_execute 
+       is called for each permutation as usual. Filters and beams apply in both cases.
+
+       If the output values are the same as before (see unchanged), the output 
+       variable is not changed, and propagation stops there.
+
+       The results of multi_execute are cached, keyed by the identity of the input values, 
+       so multi_execute must not have side effects and input values must not be modified.
+       When a multi-valued input changes, only permutations with new values are re-computed.
+       At most cache_size results are cached per method; the least recently used 
+       results are evicted first. Set cache_size to 0 to disable caching.
     """
+
+    cache_size = 256
     
     def __init__(self):
         """Call this initialize after _inputs and _outputs has been set"""
@@ -46,6 +131,18 @@ class MultiMethod(Method):
             raise StandardError, "requires exactly one output" 
         if not isinstance(self._outputs[0], MultiVariable):
             raise StandardError, "requires a MultiVariable output" 
+        self._cache = {}
+        """map from input keys to [last used, input values, result]"""
+        self._clock = 0
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._filters = []
+        """list of output selection predicates"""
+        self._rejected = 0
+        self._beam_width = None
+        self._beam_score = None
+        self._limit = None
+        self._limited = False
 
    
     def execute(self, inmap):
@@ -58,20 +155,166 @@ class MultiMethod(Method):
                 base_inmap[variable] = value
            
         outvar = self._outputs[0]
-        values = self._recurse_execute(inmap, base_inmap, self._multi_inputs)
+        values = self.batch_execute(inmap)
+        if values == None:
+            values = self._recurse_execute(inmap, base_inmap, self._multi_inputs)
+        elif len(self._filters) > 0:
+            values = self._select_all(values)
+        self._limited = False
+        if self._limit != None:
+            # stop generating values at the limit; one more distinct value 
+            # tells if any were dropped
+            distinct = ValueSet()
+            kept = []
+            for value in values:
+                if distinct.add(value):
+                    if len(kept) == self._limit:
+                        self._limited = True
+                        break
+                    kept.append(value)
+            values = kept
+        values = self.collect(values)
+        if self._beam_width != None and len(values) > self._beam_width:
+            values = self.collect(heapq.nsmallest(self._beam_width, values, self._beam_score))
+        # keep the current output if it has not changed, so it is not propagated 
+        current = inmap.get(outvar)
+        if current != None and self.unchanged(current, values):
+            values = current
         return {outvar:values}
+
+    def unchanged(self, old, new):
+        """True iff the new output values are the same as the old output values.
+           In that case, execute returns the old output, and the output variable 
+           is not changed in the MethodGraph, so methods that depend on it are not 
+           executed again. By default, the values must be identical objects, in 
+           the same order. Subclasses may override this method."""
+        if len(old) != len(new):
+            return False
+        for (a, b) in zip(old, new):
+            if a is not b:
+                return False
+        return True
+
+    def batch_execute(self, inmap):
+        """Subclasses may implement this method to compute the output values for all 
+           permutations of multi-valued input variables at once. The input map contains
+           all values of the multi-valued input variables (as stored in the graph). 
+           Must return a sequence of output values, or None to call multi_execute 
+           for each permutation instead. Batch results are not cached."""
+        return None
+
+    def set_beam(self, width, score=None):
+        """Keep only the given number of output values with the lowest score. 
+           The score is a function of an output value. If width is None, all 
+           output values are kept. Note that the method must be re-executed 
+           if the beam changes."""
+        self._beam_width = width
+        self._beam_score = score
+
+    def set_limit(self, limit):
+        """Keep only the first limit output values; the remaining permutations
+           are not executed. If limit is None, all output values are kept. Note 
+           that the method must be re-executed if the limit changes."""
+        self._limit = limit
+
+    def limited(self):
+        """True iff output values were dropped due to the limit in the last execution"""
+        return self._limited
+
+    def collect(self, values):
+        """Returns a container with the given output values, without duplicates. 
+           By default a ValueSet; subclasses may override this method."""
+        return ValueSet(values)
  
+    def iter_execute(self, inmap):
+        """Generates the output values for each permutation of multi-valued input variables, 
+           like execute, but one at a time and not collected in a ValueSet (values may be repeated). 
+           Values rejected by a filter are not generated."""
+        base_inmap = {}
+        for variable in self._inputs:
+            if variable not in self._multi_inputs:
+                base_inmap[variable] = inmap[variable]
+        return self._recurse_execute(inmap, base_inmap, self._multi_inputs)
+
     def _recurse_execute(self, inmap, base_inmap, multi_inputs):
         if len(multi_inputs) > 0:
             mvar = multi_inputs[0]
             values = inmap[mvar]
-            output = Set()
             for value in values:
                 base_inmap[mvar] = value
-                output.union_update(self._recurse_execute(inmap, base_inmap, multi_inputs[1:]))
-            return output
+                for output in self._recurse_execute(inmap, base_inmap, multi_inputs[1:]):
+                    yield output
         else:
-            return self.multi_execute(base_inmap)
+            for output in self._cached_execute(base_inmap):
+                if self._select(output):
+                    yield output
+                else:
+                    self._rejected += 1
+
+    def _select_all(self, values):
+        for value in values:
+            if self._select(value):
+                yield value
+            else:
+                self._rejected += 1
+
+    def _select(self, value):
+        for selector in self._filters:
+            if not selector(value):
+                return False
+        return True
+
+    def add_filter(self, selector):
+        """Add a filter for the output values. The filter is called with an output 
+           value and must return True iff the value is to be kept. Note that the
+           method must be re-executed if a filter changes."""
+        self._filters.append(selector)
+
+    def rem_filter(self, selector):
+        """Remove a filter"""
+        self._filters.remove(selector)
+
+    def filters(self):
+        """Returns a list of filters"""
+        return list(self._filters)
+
+    def rejected(self):
+        """Returns the number of output values rejected by filters"""
+        return self._rejected
+
+    def _cached_execute(self, inmap):
+        """call multi_execute, or return the cached result for the same input values"""
+        if self.cache_size <= 0:
+            return self.multi_execute(inmap)
+        values = tuple(map(lambda v: inmap[v], self._inputs))
+        # Note: the cache keeps references to the input values, so the ids are not re-used
+        key = tuple(map(id, values))
+        self._clock += 1
+        if key in self._cache:
+            entry = self._cache[key]
+            entry[0] = self._clock
+            self._cache_hits += 1
+            return entry[2]
+        self._cache_misses += 1
+        result = self.multi_execute(inmap)
+        self._cache[key] = [self._clock, values, result]
+        if len(self._cache) > self.cache_size:
+            self._evict()
+        return result
+
+    def _evict(self):
+        """evict the least recently used half of the cache"""
+        entries = self._cache.items()
+        entries.sort(lambda x,y: cmp(y[1][0], x[1][0]))
+        self._cache = dict(entries[:self.cache_size/2])
+
+    def cache_stats(self):
+        """Returns a dictionary with cache counters: hits, misses and size"""
+        return {"hits":self._cache_hits, "misses":self._cache_misses, "size":len(self._cache)}
+
+    def clear_cache(self):
+        """Remove all cached results"""
+        self._cache = {}
 
 
 #####
@@ -115,6 +358,35 @@ def test():
     graph.set('a', 100)
     print graph.get(mv_z)
 
+    graph.set('p', 30)
+    print graph.get(mv_z)
+    for met in graph.methods():
+        print met, met.cache_stats()
+
+    # select small values only
+    zmet = graph._graph.ingoing_vertices(mv_z)[0]
+    zmet.add_filter(lambda value: value < 1000)
+    graph.schedule(zmet)
+    graph.propagate()
+    print graph.get(mv_z), zmet.rejected(), "rejected"
+
+    # keep the first two values only
+    zmet.set_limit(2)
+    graph.schedule(zmet)
+    graph.propagate()
+    print graph.get(mv_z), zmet.limited(), "limited"
+
+    # the limit applies to distinct values: x = {2,1}, w = {4,3,2}
+    graph.set('a', 1)
+    graph.set('b', 1)
+    mv_w = MultiVariable('w')
+    graph.add_variable(mv_w)
+    graph.add_variable('two', 2)
+    wmet = SumProdMethod(mv_x, 'two', mv_w)
+    wmet.set_limit(2)
+    graph.add_method(wmet)
+    print graph.get(mv_w), wmet.limited(), "limited"
+
 
 if __name__== '__main__': test()
     
@@ -0,0 +1,151 @@
+"""Sampling the range of feasible values of a constraint parameter.
+
+The parameter of a ParametricConstraint (e.g. a distance or an angle) is
+swept over a range of values. For each value, the problem is solved
+incrementally: the decomposition of the problem is not changed, only the
+configurations of the clusters that depend on the constraint are re-computed
+(see MethodGraph.propagate). A value is feasible if the problem has a solution
+for that value. The result is a list of intervals of feasible values. The
+boundaries of the intervals can be refined by bisection.
+"""
+
+import math
+from geometric import GeometricSolver, ParametricConstraint
+from cluster import Rigid
+from tolerance import *
+
+class Interval:
+    """A closed interval of parameter values"""
+
+    def __init__(self, left, right):
+        self._left = left
+        self._right = right
+
+    def left_value(self):
+        """the smallest value in the interval"""
+        return self._left
+
+    def right_value(self):
+        """the largest value in the interval"""
+        return self._right
+
+    def __contains__(self, value):
+        return self._left <= value <= self._right
+
+    def __str__(self):
+        return "["+str(self._left)+", "+str(self._right)+"]"
+
+class ParameterRange:
+    """The feasible values of a constraint parameter, sampled in a given range.
+
+       instance attributes:
+        constraint  - the ParametricConstraint
+        intervals   - a list of Intervals of feasible values, in increasing order
+        samples     - a list of (value, feasible) pairs, in increasing order of value
+    """
+
+    def __init__(self, constraint, intervals, samples):
+        self.constraint = constraint
+        self.intervals = intervals
+        self.samples = samples
+
+    def __str__(self):
+        return "ParameterRange("+str(self.constraint)+": "+" ".join(map(str, self.intervals))+")"
+
+def sample_prange(problem, constraint, lo, hi, step, precision=None, solver=None):
+    """Determine the feasible values of the parameter of a constraint in the
+       range lo to hi, sampled at the given step size. Returns a ParameterRange.
+
+       If precision is given, the boundaries of the intervals are refined by
+       bisection, until the distance between a feasible and an infeasible
+       value is at most precision.
+
+       The problem is solved with the given GeometricSolver, or with a new one.
+       The parameter of the constraint is restored afterwards.
+    """
+    if not isinstance(constraint, ParametricConstraint):
+        raise StandardError, "not a parametric constraint: "+str(constraint)
+    if constraint not in problem.cg.constraints():
+        raise StandardError, "constraint not in problem: "+str(constraint)
+    if step <= 0:
+        raise StandardError, "step must be positive"
+    if solver == None:
+        solver = GeometricSolver(problem)
+    original = constraint.get_parameter()
+    sampler = _Sampler(solver, constraint)
+    try:
+        count = int(math.floor((hi - lo) / step + default_tol))
+        samples = []
+        for i in range(count + 1):
+            value = lo + i * step
+            samples.append((value, sampler.feasible(value)))
+        intervals = []
+        left = None
+        for i in range(len(samples)):
+            (value, feasible) = samples[i]
+            if feasible and left == None:
+                left = value
+                if i > 0 and precision != None:
+                    left = sampler.refine(samples[i-1][0], value, precision)
+            if feasible and (i == len(samples)-1 or not samples[i+1][1]):
+                right = value
+                if i < len(samples)-1 and precision != None:
+                    right = sampler.refine(samples[i+1][0], value, precision)
+                intervals.append(Interval(left, right))
+                left = None
+    finally:
+        constraint.set_parameter(original)
+    return ParameterRange(constraint, intervals, samples)
+
+class _Sampler:
+    """determines feasibility of parameter values"""
+
+    def __init__(self, solver, constraint):
+        self._solver = solver
+        self._constraint = constraint
+        # the decomposition does not change, only the configurations
+        self._clusters = filter(lambda c: isinstance(c, Rigid), solver.dr.top_level())
+
+    def feasible(self, value):
+        """True iff all top-level clusters have a solution for the given value"""
+        try:
+            self._constraint.set_parameter(value)
+        except (ArithmeticError, ValueError):
+            # degenerate configurations, e.g. coinciding points
+            return False
+        if len(self._clusters) == 0:
+            return False
+        for cluster in self._clusters:
+            solutions = self._solver.dr.get(cluster)
+            if solutions == None or len(solutions) == 0:
+                return False
+        return True
+
+    def refine(self, infeasible, feasible, precision):
+        """bisect between an infeasible and a feasible value; returns the
+           feasible value closest to the boundary"""
+        while abs(feasible - infeasible) > precision:
+            middle = (feasible + infeasible) / 2.0
+            if self.feasible(middle):
+                feasible = middle
+            else:
+                infeasible = middle
+        return feasible
+
+def test():
+    from geometric import GeometricProblem, DistanceConstraint
+    import vector
+    # a triangle: feasible iff the triangle inequality holds (1 <= d <= 5)
+    problem = GeometricProblem(dimension=3)
+    problem.add_point('a', vector.vector([0.0, 0.0, 0.0]))
+    problem.add_point('b', vector.vector([2.0, 0.0, 0.0]))
+    problem.add_point('c', vector.vector([0.0, 3.0, 0.0]))
+    problem.add_constraint(DistanceConstraint('a', 'b', 2.0))
+    problem.add_constraint(DistanceConstraint('a', 'c', 3.0))
+    con = DistanceConstraint('b', 'c', 3.6)
+    problem.add_constraint(con)
+    print sample_prange(problem, con, 0.0, 7.0, 0.5)
+    print sample_prange(problem, con, 0.0, 7.0, 0.3, 0.001)
+    print con.get_parameter()
+
+if __name__ == "__main__": test()
@@ -0,0 +1,165 @@
+"""Rigid and similarity transformations.
+
+A RigidTransform maps a point x onto scale * R x + t, where R is a rotation
+matrix, t a translation vector and scale a positive number (1.0 for rigid
+transformations). Unlike general homogeneous matrices (see matfunc), the
+inverse and the composition of these transformations have a closed form.
+
+The functions frame_2d and frame_3d create transformations from a local
+orthonormal coordinate system, defined by a few points, to the global
+coordinate system. The transformation that maps points relative to one
+frame onto points relative to another frame is then:
+
+    frame1.compose(frame2.inverse())
+"""
+
+import math
+import array
+import vector
+from tolerance import *
+
+# numpy is optional
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class RigidTransform:
+    """A rotation, followed by a uniform scaling and a translation.
+
+       Immutable.
+
+       Attributes:
+       dimension - 2 or 3
+       rotation - a dimension x dimension rotation matrix (list of rows)
+       translation - a vector
+       scale - the scale factor (1.0 for rigid transformations)
+    """
+
+    def __init__(self, rotation, translation, scale=1.0):
+        """instantiate a RigidTransform from a rotation matrix (rows), translation vector and scale"""
+        self.rotation = map(lambda row: map(float, row), rotation)
+        self.translation = vector.vector(map(float, translation))
+        self.scale = float(scale)
+        self.dimension = len(self.translation)
+
+    def inverse(self):
+        """returns the inverse transformation"""
+        d = self.dimension
+        rt = map(lambda j: map(lambda i: self.rotation[i][j], range(d)), range(d))
+        t = map(lambda row: -_dot(row, self.translation) / self.scale, rt)
+        return RigidTransform(rt, t, 1.0 / self.scale)
+
+    def compose(self, other):
+        """returns the transformation that applies other first and then this transformation"""
+        d = self.dimension
+        r = map(lambda i: map(lambda j: _dot(self.rotation[i], map(lambda row: row[j], other.rotation)), range(d)), range(d))
+        t = map(lambda i: self.scale * _dot(self.rotation[i], other.translation) + self.translation[i], range(d))
+        return RigidTransform(r, t, self.scale * other.scale)
+
+    def apply_point(self, p):
+        """returns the transformed point (a vector)"""
+        d = self.dimension
+        return vector.vector(map(lambda i: self.scale * _dot(self.rotation[i], p) + self.translation[i], range(d)))
+
+    def apply(self, coords):
+        """transforms an array of coordinates: a numpy array of shape (..., dimension),
+           or a flat array.array if numpy is not available"""
+        d = self.dimension
+        if numpy:
+            r = numpy.array(self.rotation)
+            return self.scale * numpy.dot(coords, r.T) + numpy.array(self.translation)
+        else:
+            result = array.array('d')
+            for i in range(0, len(coords), d):
+                p = coords[i:i+d]
+                for j in range(d):
+                    result.append(self.scale * _dot(self.rotation[j], p) + self.translation[j])
+            return result
+
+    def __str__(self):
+        return "RigidTransform(rotation="+str(self.rotation)+", translation="+str(list(self.translation))+", scale="+str(self.scale)+")"
+
+def apply_all(transforms, coords):
+    """Applies a list of K RigidTransforms of the same dimension to the same points.
+       With numpy, coords is a N x d array and the result is a K x N x d array.
+       Otherwise, the results (flat arrays) are concatenated."""
+    if numpy:
+        r = numpy.array(map(lambda t: t.rotation, transforms))
+        t = numpy.array(map(lambda t: t.translation, transforms))
+        s = numpy.array(map(lambda t: t.scale, transforms))
+        result = numpy.einsum('kij,nj->kni', r, coords)
+        return s[:,numpy.newaxis,numpy.newaxis] * result + t[:,numpy.newaxis,:]
+    else:
+        result = array.array('d')
+        for t in transforms:
+            result.extend(t.apply(coords))
+        return result
+
+def identity(dimension):
+    """the identity transformation"""
+    r = map(lambda i: map(lambda j: float(i == j), range(dimension)), range(dimension))
+    return RigidTransform(r, [0.0]*dimension)
+
+def uniform_scale(pivot, scale):
+    """scaling around a pivot point"""
+    d = len(pivot)
+    r = map(lambda i: map(lambda j: float(i == j), range(d)), range(d))
+    return RigidTransform(r, map(lambda x: x - scale * x, pivot), scale)
+
+def frame_2d(a, b, scaled=False):
+    """The transformation from a 2D frame with origin a and x-axis towards b,
+       to global coordinates. If scaled, the unit of the frame is the distance
+       between a and b. Returns None if a and b coincide."""
+    u = vector.vector(b) - vector.vector(a)
+    length = vector.norm(u)
+    if tol_eq(length, 0.0):
+        return None
+    u = u / length
+    r = [[u[0], -u[1]], [u[1], u[0]]]
+    if scaled:
+        return RigidTransform(r, a, length)
+    else:
+        return RigidTransform(r, a)
+
+def frame_3d(a, b, c):
+    """The transformation from a 3D orthonormal frame with origin a, x-axis towards b
+       and c in the xy-plane (positive y), to global coordinates.
+       If a, b and c are collinear, the y-axis is chosen arbitrarily.
+       Returns None if a and b coincide."""
+    a = vector.vector(a)
+    u = vector.vector(b) - a
+    length = vector.norm(u)
+    if tol_eq(length, 0.0):
+        return None
+    u = u / length
+    v = vector.vector(c) - a
+    w = vector.cross(u, v)
+    if tol_eq(vector.norm(w), 0.0):
+        # collinear: use any vector not parallel to u
+        if abs(u[0]) < 0.9:
+            w = vector.cross(u, vector.vector([1.0,0.0,0.0]))
+        else:
+            w = vector.cross(u, vector.vector([0.0,1.0,0.0]))
+    w = w / vector.norm(w)
+    v = vector.cross(w, u)
+    r = [[u[0], v[0], w[0]], [u[1], v[1], w[1]], [u[2], v[2], w[2]]]
+    return RigidTransform(r, a)
+
+def _dot(a, b):
+    total = 0.0
+    for i in range(len(a)):
+        total += a[i]*b[i]
+    return total
+
+def test():
+    f1 = frame_3d([1.0,0.0,0.0], [1.0,2.0,0.0], [0.0,0.0,3.0])
+    f2 = frame_3d([0.0,0.0,0.0], [1.0,0.0,0.0], [0.0,1.0,0.0])
+    t = f1.compose(f2.inverse())
+    print t
+    print t.apply_point([1.0,0.0,0.0]), t.inverse().apply_point(t.apply_point([1.0,2.0,3.0]))
+    print frame_3d([1.0,0.0,0.0], [1.0,0.0,0.0], [0.0,0.0,3.0])
+    s = uniform_scale([1.0,1.0], 2.0)
+    print s.apply_point([2.0,2.0]), s.inverse().apply_point([3.0,3.0])
+
+if __name__ == "__main__": test()
@@ -0,0 +1,189 @@
+"""Factored solution spaces for multi-valued variables in a methodgraph.
+
+The values of a MultiVariable that is determined by a MultiMethod are the
+union (OR) over all combinations (AND) of the values of its multi-valued
+inputs, of the outputs of the method for that combination. When several
+methods each choose between alternatives (e.g. reflections), the number of
+values multiplies along the graph. A SolutionSpace represents these values
+without enumerating them: it bounds their number, computes the i-th value on 
+demand and iterates over them lazily.
+
+The values of a variable that is not determined by a MultiMethod are taken
+from the methodgraph.
+
+Indexing assumes uniform branching: a method returns the same number of
+output values for every combination of input values. This number is
+determined from the first combination. Combinations for which a method
+returns fewer values, or values rejected by a filter, have no value, and 
+value(i) returns None. Different indices may give equal values. So the 
+number of indices (see count_bound) is only an upper bound on the number of 
+values. Iteration skips missing and duplicate values, like a MultiVariable.
+
+The output values of a method are cached for each combination of input values,
+so values shared by several variables are computed only once. SolutionSpaces
+for several variables of the same methodgraph can share their caches (see space).
+"""
+
+from multimethod import MultiVariable, MultiMethod, ValueSet
+
+class SolutionSpace:
+    """The factored solution space of a variable in a MethodGraph"""
+
+    def __init__(self, methodgraph, variable, _nodes=None):
+        """Create a SolutionSpace for a variable in a MethodGraph"""
+        self._mg = methodgraph
+        if _nodes == None:
+            _nodes = {}
+        self._nodes = _nodes
+        """map from variables to nodes (created on demand)"""
+        self._root = self._node(variable)
+
+    def space(self, variable):
+        """Returns a SolutionSpace for another variable in the same MethodGraph, 
+           that shares the values computed by this SolutionSpace"""
+        return SolutionSpace(self._mg, variable, self._nodes)
+
+    def count_bound(self):
+        """Returns the number of indices (a long integer), without enumerating 
+           values. This is an upper bound on the number of distinct values."""
+        return self._root.count()
+
+    def value(self, i):
+        """Returns the value at index i, or None if that combination has no value"""
+        if i < 0 or i >= self.count_bound():
+            raise IndexError, "solution index out of range"
+        return self._root.value(i)
+
+    def __iter__(self):
+        """Generates the distinct values one at a time"""
+        seen = ValueSet()
+        i = 0L
+        n = self.count_bound()
+        while i < n:
+            value = self._root.value(i)
+            if value != None and seen.add(value):
+                yield value
+            i += 1
+
+    def _node(self, variable):
+        if variable not in self._nodes:
+            method = self._mg.determining_method(variable)
+            if isinstance(method, MultiMethod) and isinstance(variable, MultiVariable):
+                inputs = []
+                for var in method.inputs():
+                    if isinstance(var, MultiVariable):
+                        inputs.append(self._node(var))
+                self._nodes[variable] = _MethodNode(self._mg, method, inputs)
+            else:
+                self._nodes[variable] = _LeafNode(self._mg.get(variable))
+        return self._nodes[variable]
+
+    def __str__(self):
+        return "SolutionSpace(at most "+str(self.count_bound())+" solutions)"
+
+class _LeafNode:
+    """values taken from the methodgraph"""
+
+    def __init__(self, values):
+        if values == None:
+            self._values = []
+        else:
+            self._values = list(values)
+
+    def count(self):
+        return long(len(self._values))
+
+    def value(self, i):
+        return self._values[int(i)]
+
+class _MethodNode:
+    """values of a MultiMethod output, for all combinations of input values (OR of AND)"""
+
+    cache_size = 1024
+
+    def __init__(self, methodgraph, method, inputs):
+        self._mg = methodgraph
+        self._method = method
+        self._inputs = inputs
+        self._count = None
+        self._branching = None
+        self._cache = {}
+        """map from combinations to output values"""
+
+    def count(self):
+        if self._count == None:
+            n = 1L
+            for node in self._inputs:
+                n = n * node.count()
+            if n > 0:
+                n = n * self.branching()
+            self._count = n
+        return self._count
+
+    def branching(self):
+        """the number of output values per input combination (from the first combination)"""
+        if self._branching == None:
+            outputs = self._execute(0L)
+            if outputs == None:
+                self._branching = 1
+            else:
+                self._branching = max(1, len(outputs))
+        return self._branching
+
+    def value(self, i):
+        branch = i % self.branching()
+        outputs = self._execute(i / self.branching())
+        if outputs == None or branch >= len(outputs):
+            return None
+        return outputs[int(branch)]
+
+    def _execute(self, combination):
+        """output values for a combination of input values (cached)"""
+        if combination in self._cache:
+            return self._cache[combination]
+        if len(self._cache) >= self.cache_size:
+            self._cache = {}
+        outputs = self._compute(combination)
+        self._cache[combination] = outputs
+        return outputs
+
+    def _compute(self, combination):
+        inmap = {}
+        node = 0
+        for var in self._method.inputs():
+            if isinstance(var, MultiVariable):
+                n = self._inputs[node].count()
+                value = self._inputs[node].value(combination % n)
+                if value == None:
+                    return None
+                inmap[var] = [value]
+                combination = combination / n
+                node += 1
+            else:
+                inmap[var] = self._mg.get(var)
+        return list(self._method.iter_execute(inmap))
+
+def test():
+    from method import MethodGraph
+    from multimethod import SumProdMethod
+    graph = MethodGraph()
+    graph.add_variable('a', 1)
+    graph.add_variable('b', 2)
+    previous = None
+    # a chain of 20 methods with 2 values each: 2^20 values
+    for i in range(20):
+        mv = MultiVariable('x'+str(i))
+        graph.add_variable(mv)
+        if previous == None:
+            graph.add_method(SumProdMethod('a','b', mv), False)
+        else:
+            graph.add_method(SumProdMethod(previous,'b', mv), False)
+        previous = mv
+    space = SolutionSpace(graph, previous)
+    print space
+    print "first values:", map(space.value, range(8))
+    print "last value:", space.value(space.count_bound()-1)
+    # different combinations can give the same value
+    print "distinct values:", len(list(space))
+
+if __name__ == "__main__": test()
@@ -100,12 +100,184 @@ class vector(list):
 
 ###############################################################################
 
+class fastvector(object):
+	"""
+	A 2D or 3D vector with the same interface as vector, 
+	but faster: coordinates are stored in slots and
+	arithmetic is unrolled. A 2D vector can be extended
+	to 3D with append. Slices are vectors.
+	"""
+	__slots__ = ('x', 'y', 'z', '_n')
+
+	def __init__(self, values):
+		values = tuple(values)
+		if len(values) == 2:
+			(self.x, self.y) = values
+			self.z = 0.0
+		elif len(values) == 3:
+			(self.x, self.y, self.z) = values
+		else:
+			raise TypeError, 'fastvector::FAILURE in __init__, dimension must be 2 or 3'
+		self._n = len(values)
+
+	def __len__(self):
+		return self._n
+
+	def __getitem__(self, i):
+		if i.__class__ is slice:
+			return vector(list(self)[i])
+		if i < 0:
+			i += self._n
+		if i == 0:
+			return self.x
+		elif i == 1:
+			return self.y
+		elif i == 2 and self._n == 3:
+			return self.z
+		raise IndexError, 'fastvector index out of range'
+
+	def __setitem__(self, i, value):
+		if i < 0:
+			i += self._n
+		if i == 0:
+			self.x = value
+		elif i == 1:
+			self.y = value
+		elif i == 2 and self._n == 3:
+			self.z = value
+		else:
+			raise IndexError, 'fastvector assignment index out of range'
+
+	def __iter__(self):
+		if self._n == 2:
+			return iter((self.x, self.y))
+		else:
+			return iter((self.x, self.y, self.z))
+
+	def append(self, value):
+		if self._n != 2:
+			raise TypeError, 'fastvector::FAILURE in append, dimension must be 2 or 3'
+		self.z = value
+		self._n = 3
+
+	def __add__(self, other):
+		if other.__class__ is fastvector and other._n == self._n:
+			if self._n == 2:
+				return _vector2(self.x+other.x, self.y+other.y)
+			return _vector3(self.x+other.x, self.y+other.y, self.z+other.z)
+		return fastvector(map(lambda x,y: x+y, self, other))
+
+	__radd__ = __add__
+
+	def __sub__(self, other):
+		if other.__class__ is fastvector and other._n == self._n:
+			if self._n == 2:
+				return _vector2(self.x-other.x, self.y-other.y)
+			return _vector3(self.x-other.x, self.y-other.y, self.z-other.z)
+		return fastvector(map(lambda x,y: x-y, self, other))
+
+	def __rsub__(self, other):
+		return fastvector(map(lambda x,y: x-y, other, self))
+
+	def __neg__(self):
+		if self._n == 2:
+			return _vector2(-self.x, -self.y)
+		return _vector3(-self.x, -self.y, -self.z)
+
+	def __mul__(self, other):
+		"""
+		Element by element multiplication, or multiplication by a constant
+		"""
+		if other.__class__ in _scalars:
+			if self._n == 2:
+				return _vector2(self.x*other, self.y*other)
+			return _vector3(self.x*other, self.y*other, self.z*other)
+		elif other.__class__ is fastvector and other._n == self._n:
+			if self._n == 2:
+				return _vector2(self.x*other.x, self.y*other.y)
+			return _vector3(self.x*other.x, self.y*other.y, self.z*other.z)
+		try:
+			return fastvector(map(lambda x,y: x*y, self, other))
+		except:
+			return fastvector(map(lambda x: x*other, self))
+
+	__rmul__ = __mul__
+
+	def __div__(self, other):
+		"""
+		Element by element division, or division by a constant
+		"""
+		if other.__class__ in _scalars:
+			if self._n == 2:
+				return _vector2(self.x/other, self.y/other)
+			return _vector3(self.x/other, self.y/other, self.z/other)
+		try:
+			return fastvector(map(lambda x,y: x/y, self, other))
+		except:
+			return fastvector(map(lambda x: x/other, self))
+
+	__truediv__ = __div__
+
+	def __rdiv__(self, other):
+		try:
+			return fastvector(map(lambda x,y: x/y, other, self))
+		except:
+			return fastvector(map(lambda x: other/x, self))
+
+	__rtruediv__ = __rdiv__
+
+	def __eq__(self, other):
+		try:
+			return len(other) == self._n and list(self) == list(other)
+		except TypeError:
+			return False
+
+	def __ne__(self, other):
+		return not self == other
+
+	__hash__ = None
+
+	def __getstate__(self):
+		return tuple(self)
+
+	def __setstate__(self, state):
+		self.__init__(state)
+
+	def __repr__(self):
+		return repr(list(self))
+
+	def size(self): 
+		return self._n
+
+	def out(self):
+		print self
+
+_scalars = (float, int, long)
+
+def _vector2(x, y):
+	v = object.__new__(fastvector)
+	v.x = x
+	v.y = y
+	v.z = 0.0
+	v._n = 2
+	return v
+
+def _vector3(x, y, z):
+	v = object.__new__(fastvector)
+	v.x = x
+	v.y = y
+	v.z = z
+	v._n = 3
+	return v
+
+###############################################################################
+
 
 def isVector(x):
     """
-    Determines if the argument is a vector class object.
+    Determines if the argument is a vector class object (vector or fastvector).
     """
-    return hasattr(x,'__class__') and x.__class__ is vector
+    return hasattr(x,'__class__') and (x.__class__ is vector or x.__class__ is fastvector)
 
 def zeros(n):
     """
@@ -136,6 +308,8 @@ def dot(a, b):
     """
     dot product of two vectors.
     """
+    if a.__class__ is fastvector and b.__class__ is fastvector and a._n == b._n:
+	return a.x*b.x + a.y*b.y + a.z*b.z
     try:
 	return reduce(lambda x, y: x+y, a*b, 0.)
     except:
@@ -145,7 +319,9 @@ def cross(a, b):
     """
     cross product of two 3-vectors.
     """
-    if len(a) == len(b) == 3:
+    if a.__class__ is fastvector and b.__class__ is fastvector and a._n == b._n == 3:
+	return _vector3(a.y*b.z - a.z*b.y, a.z*b.x - a.x*b.z, a.x*b.y - a.y*b.x)
+    elif len(a) == len(b) == 3:
 	return vector([a[1]*b[2] - a[2]*b[1],
 		a[2]*b[0] - a[0]*b[2],
 		a[0]*b[1] - a[1]*b[0]])
@@ -156,6 +332,8 @@ def norm(a):
     """
     Computes the norm of vector a.
     """
+    if a.__class__ is fastvector:
+	return math.sqrt(a.x*a.x + a.y*a.y + a.z*a.z)
     try:
 	return math.sqrt(abs(dot(a,a)))
     except:
@@ -314,6 +492,33 @@ def atan2(a,b):
 	
 
 ###############################################################################
+
+def benchmark(n=100000):
+	"""
+	Compares the speed of vector and fastvector operations
+	"""
+	import time
+	for dim in [2, 3]:
+		for cls in [vector, fastvector]:
+			a = cls(map(lambda i: random.uniform(0.0, 1.0), range(dim)))
+			b = cls(map(lambda i: random.uniform(0.0, 1.0), range(dim)))
+			t0 = time.time()
+			for i in xrange(n):
+				c = a + b
+				c = a - b
+				c = a * 2.0
+				c = a / 2.0
+			t1 = time.time()
+			for i in xrange(n):
+				d = dot(a, b)
+				d = norm(a)
+			t2 = time.time()
+			if dim == 3:
+				for i in xrange(n):
+					c = cross(a, b)
+			t3 = time.time()
+			print "%s %dD: arithmetic %.2fs, dot+norm %.2fs, cross %.2fs" % (cls.__name__, dim, t1-t0, t2-t1, t3-t2)
+
 if __name__ == "__main__":
 
 	print 'a = zeros(4)'
@@ -400,3 +605,5 @@ if __name__ == "__main__":
 
 	except: pass
 
+	benchmark()
+
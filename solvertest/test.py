@@ -5,6 +5,8 @@ from geosolver.geometric import *
 from geosolver.vector import vector 
 from geosolver.randomproblem import *
 from geosolver.diagnostic import diag_select, diag_print
+from geosolver.budget import CancelToken
+from geosolver.configuration import Configuration
 import geosolver.tolerance
 from time import time
 
@@ -652,9 +654,160 @@ def test(problem):
     else:
         print "INVALID"
 
+def _same_solutions(solutions1, solutions2):
+    """True iff both lists of solutions contain the same (congruent) configurations"""
+    if len(solutions1) != len(solutions2):
+        return False
+    configurations = map(Configuration, solutions2)
+    for solution in solutions1:
+        if len(filter(lambda c: c == Configuration(solution), configurations)) == 0:
+            return False
+    return True
+
+def _distances(problem):
+    return filter(lambda c: isinstance(c, DistanceConstraint), problem.cg.constraints())
+
+def test_deferred(problem):
+    """Test that loading a problem in a batch gives the same top-level
+       decomposition and classification. (Intermediate clusters may differ,
+       also between two solvers in the same mode, due to the search order)"""
+    deferred = GeometricSolver(problem, deferred=True)
+    immediate = GeometricSolver(problem, deferred=False)
+    clusters1 = map(lambda c: str(sorted(c.vars)), deferred.dr.top_level())
+    clusters2 = map(lambda c: str(sorted(c.vars)), immediate.dr.top_level())
+    clusters1.sort()
+    clusters2.sort()
+    print "deferred:", deferred.get_constrainedness(), clusters1
+    print "immediate:", immediate.get_constrainedness(), clusters2
+    assert clusters1 == clusters2
+    assert deferred.get_constrainedness() == immediate.get_constrainedness()
+    print "same decomposition"
+
+def test_update(problem):
+    """Test that GeometricProblem.update gives the same result as a new solver"""
+    solver = GeometricSolver(problem)
+    solver.get_result()
+    constraints = _distances(problem)[:3]
+    old = {}
+    new = {}
+    for con in constraints:
+        old[con] = con.get_parameter()
+        new[con] = con.get_parameter() * 1.001
+    problem.update(parameters=new)
+    result = solver.get_result()
+    expected = GeometricSolver(problem).get_result()
+    problem.update(parameters=old)
+    assert result.flag == expected.flag
+    assert _same_solutions(result.solutions, expected.solutions)
+    print "update ok:", len(result.solutions), "solutions"
+
+def _count(solver):
+    """the number of configurations of all clusters"""
+    return sum(map(lambda c: len(solver.dr.get(c) or []), solver.dr.rigids()))
+
+def test_beam(problem):
+    """Test that a beam keeps the solution closest to the prototype"""
+    full = GeometricSolver(problem)
+    beam = GeometricSolver(problem, beam=1)
+    print "beam:", _count(beam), "of", _count(full), "configurations"
+    for cluster in beam.dr.rigids():
+        assert len(beam.dr.get(cluster)) <= 1
+    result = beam.get_result()
+    assert _same_solutions(result.solutions, full.get_result().solutions)
+    for solution in result.solutions:
+        assert problem.verify(solution)
+
+def test_tracking(problem):
+    """Test that tracking follows the closest solution after a change"""
+    solver = GeometricSolver(problem)
+    solver.set_tracking(True)
+    chosen = solver.get_result().solutions
+    assert len(chosen) == 1
+    con = _distances(problem)[0]
+    old = con.get_parameter()
+    con.set_parameter(old * 1.001)
+    tracked = solver.get_result().solutions
+    solutions = GeometricSolver(problem).get_result().solutions
+    con.set_parameter(old)
+    print "tracking:", len(tracked), "of", len(solutions), "solutions"
+    if len(solutions) == 0:
+        assert len(tracked) == 0
+    else:
+        closest = min(solutions, key=lambda s: Configuration(s).difference(Configuration(chosen[0])))
+        assert len(tracked) == 1
+        assert Configuration(tracked[0]) == Configuration(closest)
+    solver.set_tracking(False)
+    assert len(solver.get_result().solutions) == len(GeometricSolver(problem).get_result().solutions)
+
+def test_limits(problem):
+    """Test that solution limits give partial results, and that solving resumes"""
+    full = GeometricSolver(problem)
+    solver = GeometricSolver(problem, max_solutions=1)
+    print "limits:", _count(solver), "of", _count(full), "configurations"
+    for cluster in solver.dr.rigids():
+        assert len(solver.dr.get(cluster)) <= 1
+    solver.set_limits()
+    assert len(filter(solver.dr.limited, solver.dr.rigids())) == 0
+    result = solver.get_result()
+    assert result.status == GeometricCluster.COMPLETE
+    assert _same_solutions(result.solutions, full.get_result().solutions)
+    result = GeometricSolver(problem, deadline=time()+3600.0).get_result()
+    assert result.status == GeometricCluster.COMPLETE
+    assert _same_solutions(result.solutions, full.get_result().solutions)
+
+def test_structure_only(problem):
+    """Test that structure-only mode gives the same results on demand"""
+    eager = GeometricSolver(problem)
+    structural = GeometricSolver(problem, structure_only=True)
+    executions = structural.dr._mg.propagation_stats()["executions"]
+    print "structure only:", structural.get_structural_constrainedness(), executions, "executions"
+    assert executions == 0
+    assert structural.get_structural_constrainedness() == eager.get_structural_constrainedness()
+    result = structural.get_result()
+    expected = eager.get_result()
+    assert result.flag == expected.flag
+    assert _same_solutions(result.solutions, expected.solutions)
+    structural.set_structure_only(False)
+    assert structural.get_constrainedness() == eager.get_constrainedness()
+
+def test_interrupted(problem):
+    """Test that a solver with an exhausted budget reports an unsolved problem"""
+    token = CancelToken()
+    token.cancel()
+    expired = GeometricSolver(problem, deadline=time()-1.0)
+    cancelled = GeometricSolver(problem, token=token)
+    for (solver, status) in [(expired, GeometricCluster.DEADLINE), 
+                             (cancelled, GeometricCluster.CANCELLED)]:
+        result = solver.get_result()
+        print "interrupted:", result.flag, result.status, solver.get_constrainedness()
+        assert result.flag == GeometricCluster.UNSOLVED
+        assert result.status == status
+        assert solver.get_constrainedness() == "unsolved"
+    # resume solving without limits
+    token.reset()
+    solver = GeometricSolver(problem)
+    for interrupted in [expired, cancelled]:
+        interrupted.set_limits()
+        assert interrupted.get_constrainedness() == solver.get_constrainedness()
+        assert interrupted.get_result().status == GeometricCluster.COMPLETE
+    print "interrupted solving ok"
+
   
 # ----- what to test today -------
 
+if __name__ == "__main__": 
+    test_interrupted(double_tetrahedron_problem())
+
+if __name__ == "__main__": 
+    test_deferred(overconstrained_tetra())
+    for problem in [double_tetrahedron_problem(), random_distance_problem_3D(8,1.0,0.0)]:
+        test_deferred(problem)
+        test_update(problem)
+        test_beam(problem)
+        test_tracking(problem)
+        test_limits(problem)
+        test_structure_only(problem)
+
 #if __name__ == "__main__": 
 #    find_error(1000, 4)
 